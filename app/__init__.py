@@ -29,7 +29,8 @@ def create_app(config_class=Config):
 
     db.init_app(app)
     login.init_app(app)
-    socketio.init_app(app)
+    from app.socketio_queue import client_manager_options
+    socketio.init_app(app, **client_manager_options(app))
     mail.init_app(app)
     csrf.init_app(app)
     limiter.init_app(app)
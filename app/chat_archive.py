@@ -0,0 +1,90 @@
+"""
+Chat message retention: old messages move to the chat_message_archive table.
+
+archive() moves every message sent before a cutoff, in chunks of consecutive
+ids, each chunk its own short transaction (INSERT ... SELECT, then DELETE), so
+chat_message is never locked for long. Ids are kept, and everything up to
+the last id sent before the cutoff is moved, except the newest message of
+the table: chat_message ids are never reused, so archived ids are all lower
+than the ones left in chat_message. history_page() relies on that: it reads
+chat_message first and only continues in the archive when the page is not
+full, which is when the user scrolled back past the live messages.
+
+Archived messages keep their read flag but are no longer marked as read;
+the conversation counters are reset on read as before.
+"""
+import time
+from sqlalchemy import delete, func, insert, select
+from app import db
+from app.models import ChatMessage, ChatMessageArchive
+
+COLUMNS = ('id', 'sender_id', 'receiver_id', 'content', 'timestamp', 'read')
+
+def boundary(cutoff):
+    """
+    Highest id to archive: the last message sent before cutoff, but never the
+    newest message, so new ids keep growing past the archived ones (SQLite
+    without AUTOINCREMENT and InnoDB before 8.0 restart from max(id) + 1).
+    Returns None if there is nothing to archive.
+    """
+    last_id = db.session.execute(select(func.max(ChatMessage.id)).where(ChatMessage.timestamp < cutoff)).scalar()
+    newest = db.session.execute(select(func.max(ChatMessage.id))).scalar()
+    if last_id is not None and last_id >= newest:
+        last_id = newest - 1
+    return last_id or None
+
+def archive(cutoff, chunk_size=1000, pause=0):
+    """
+    Move the messages sent before cutoff to the archive, chunk_size rows per
+    transaction, sleeping pause seconds between chunks. Returns how many
+    messages were moved.
+    """
+    last_id = boundary(cutoff)
+    if last_id is None:
+        return 0
+
+    source = [getattr(ChatMessage, column) for column in COLUMNS]
+    target = [getattr(ChatMessageArchive, column) for column in COLUMNS]
+    moved = 0
+    while True:
+        # Next chunk of ids, walked on the primary key
+        ids = db.session.execute(
+            select(ChatMessage.id).where(ChatMessage.id <= last_id)
+            .order_by(ChatMessage.id).limit(chunk_size)).scalars().all()
+        if not ids:
+            break
+        in_chunk = ChatMessage.id.in_(ids)
+
+        # Rows already copied by an interrupted run are copied again, so clear them first
+        db.session.execute(delete(ChatMessageArchive).where(ChatMessageArchive.id.in_(ids)))
+        db.session.execute(insert(ChatMessageArchive).from_select(target, select(*source).where(in_chunk)))
+        db.session.execute(delete(ChatMessage).where(in_chunk))
+        db.session.commit()
+
+        moved += len(ids)
+        if pause:
+            time.sleep(pause)
+    return moved
+
+def history_page(user_id, other_user_id, before_id, limit):
+    """
+    Return up to limit messages between two users, newest first, older than
+    before_id if given: from chat_message, then from the archive.
+    """
+    messages = _page(ChatMessage, user_id, other_user_id, before_id, limit)
+    if len(messages) < limit:
+        older_than = messages[-1].id if messages else before_id
+        messages += _page(ChatMessageArchive, user_id, other_user_id, older_than, limit - len(messages))
+    return messages
+
+def _page(model, user_id, other_user_id, before_id, limit):
+    # One index range scan per direction, newest first, merged here
+    messages = []
+    for sender_id, receiver_id in ((user_id, other_user_id), (other_user_id, user_id)):
+        query = select(*[getattr(model, column) for column in COLUMNS]) \
+            .where(model.sender_id == sender_id, model.receiver_id == receiver_id)
+        if before_id is not None:
+            query = query.where(model.id < before_id)
+        messages += db.session.execute(query.order_by(model.id.desc()).limit(limit)).all()
+    messages.sort(key=lambda msg: msg.id, reverse=True)
+    return messages[:limit]
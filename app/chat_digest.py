@@ -0,0 +1,127 @@
+"""
+Email digests of the chat messages received while offline.
+
+Instead of one email per message, every message for an offline user is
+counted in the user's chat_email_digest row. A background task sends the
+digest once the conversation has been quiet for CHAT_DIGEST_QUIET seconds,
+or CHAT_DIGEST_MAX_DELAY seconds after the first message, listing only what
+is still unread; if the user read everything in the meantime, nothing is
+sent. Rows live in the database, so any worker can send a digest queued by
+another one, and each digest is claimed by exactly one worker.
+"""
+from datetime import datetime, timedelta
+from threading import Lock
+from flask import current_app
+from sqlalchemy import case, delete, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from app import db, socketio
+from app.models import ChatEmailDigest, ChatMessage
+from app.user_roster import get_user
+
+PREVIEW_MESSAGES = 5   # Latest messages quoted in the digest
+PREVIEW_LENGTH = 100
+
+def queue_message(recipient_id, message_id):
+    """Count a message for an offline recipient in their pending digest. Commits."""
+    start_task()
+    now = datetime.utcnow()
+    stmt = (update(ChatEmailDigest)
+            .where(ChatEmailDigest.recipient_id == recipient_id)
+            .values(last_message_id=case((ChatEmailDigest.last_message_id < message_id, message_id),
+                                         else_=ChatEmailDigest.last_message_id),
+                    message_count=ChatEmailDigest.message_count + 1,
+                    last_at=now))
+    if not db.session.execute(stmt).rowcount:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(ChatEmailDigest).values(
+                    recipient_id=recipient_id, first_message_id=message_id, last_message_id=message_id,
+                    message_count=1, first_at=now, last_at=now))
+        except IntegrityError:
+            # Another message created the digest first
+            db.session.execute(stmt)
+    db.session.commit()
+
+def cancel_if_read(user_id):
+    """Drop the user's pending digest once they have read every message in it. Commits."""
+    digest = db.session.execute(_PENDING.where(ChatEmailDigest.recipient_id == user_id)).first()
+    if digest and not _unread_query(digest, func.count()).scalar():
+        db.session.execute(_claim(digest))
+        db.session.commit()
+
+# (recipient_id, first_message_id, last_message_id) of pending digests
+_PENDING = select(ChatEmailDigest.recipient_id, ChatEmailDigest.first_message_id, ChatEmailDigest.last_message_id)
+
+def _claim(digest):
+    # Deletes nothing if a message was added to the digest since it was read
+    return delete(ChatEmailDigest).where(
+        ChatEmailDigest.recipient_id == digest.recipient_id,
+        ChatEmailDigest.last_message_id == digest.last_message_id)
+
+def _unread_query(digest, *columns):
+    return db.session.query(*columns).filter(
+        ChatMessage.receiver_id == digest.recipient_id,
+        ChatMessage.read == False,
+        ChatMessage.id.between(digest.first_message_id, digest.last_message_id))
+
+def send_due(now=None):
+    """Send every digest whose quiet period or maximum delay has passed. Returns how many were sent."""
+    now = now or datetime.utcnow()
+    quiet = now - timedelta(seconds=current_app.config['CHAT_DIGEST_QUIET'])
+    oldest = now - timedelta(seconds=current_app.config['CHAT_DIGEST_MAX_DELAY'])
+    due = db.session.execute(_PENDING.where(
+        or_(ChatEmailDigest.last_at <= quiet, ChatEmailDigest.first_at <= oldest))).all()
+
+    sent = 0
+    for digest in due:
+        # Claim it: only one worker deletes the row
+        claimed = db.session.execute(_claim(digest)).rowcount
+        db.session.commit()
+        if claimed and _send(digest):
+            sent += 1
+    return sent
+
+def _send(digest):
+    """Email what is still unread of a claimed digest. Returns False if everything was read."""
+    recipient = get_user(digest.recipient_id)
+    if not recipient:
+        return False
+    counts = _unread_query(digest, ChatMessage.sender_id, func.count()).group_by(ChatMessage.sender_id).all()
+    if not counts:
+        return False
+
+    latest = _unread_query(digest, ChatMessage.sender_id, ChatMessage.content) \
+        .order_by(ChatMessage.id.desc()).limit(PREVIEW_MESSAGES).all()
+    previews = [(get_user(sender_id), content[:PREVIEW_LENGTH] + '...' if len(content) > PREVIEW_LENGTH else content)
+                for sender_id, content in reversed(latest) if get_user(sender_id)]
+    senders = [(get_user(sender_id), count) for sender_id, count in counts if get_user(sender_id)]
+    if not senders:
+        return False
+
+    from app.email import send_chat_notification_email, send_chat_digest_email
+    if len(previews) == 1 and len(senders) == 1 and senders[0][1] == 1:
+        send_chat_notification_email(previews[0][0], recipient, previews[0][1])
+    else:
+        send_chat_digest_email(recipient, senders, previews)
+    return True
+
+_lock = Lock()
+_task_started = False
+
+def start_task():
+    """Start this process's background task that sends the due digests."""
+    global _task_started
+    with _lock:
+        if not _task_started:
+            _task_started = True
+            socketio.start_background_task(_run, current_app._get_current_object())
+
+def _run(app):
+    while True:
+        socketio.sleep(app.config['CHAT_DIGEST_POLL'])
+        with app.app_context():
+            try:
+                send_due()
+            except Exception as e:
+                db.session.rollback()
+                print(f'Error sending chat email digests: {e!r}')
@@ -0,0 +1,203 @@
+"""
+Chat message persistence, optionally through a group-commit buffer.
+
+By default every message is inserted and committed on its own. With
+CHAT_WRITE_BUFFER enabled, messages are queued in memory instead and written
+by a background task every CHAT_WRITE_INTERVAL seconds (or as soon as
+CHAT_WRITE_BATCH are waiting) with one multi-row INSERT and one commit, so a
+burst of messages shares a single round trip and fsync.
+
+Buffered messages get their id from a block reserved in the 'chat_message'
+IdSequence, so new_message can be emitted before the row is written. A block
+is only used for ID_BLOCK_TTL seconds: ids from different workers interleave
+by at most that long, and history (ordered by id) stays chronological. The
+ids left in an expired block are never used, so blocks are sized to the
+traffic: one id while messages are sparse, doubling up to CHAT_ID_BLOCK_SIZE
+while each block runs out before it expires, and back to one once a block
+expires. The buffer is flushed at exit; a crash can lose the last
+CHAT_WRITE_INTERVAL of messages. Every worker must use the same setting,
+since autoincrement ids and reserved ids would collide.
+"""
+import atexit
+import time
+from datetime import datetime
+from threading import Lock
+from flask import current_app
+from sqlalchemy import case, func, insert, select
+from sqlalchemy.exc import IntegrityError
+from app import db, socketio
+from app.models import ChatMessage, IdSequence
+from app import conversations
+
+SEQUENCE = 'chat_message'
+ID_BLOCK_TTL = 2.0
+RETRY_DELAYS = (0.1, 0.5, 1, 2, 5)  # Seconds between attempts while the database is unavailable
+
+def reserve_ids(count):
+    """
+    Atomically reserve count message ids. Returns (first, last). The sequence
+    never hands out ids at or below the highest id in the table, so it can be
+    enabled on a database written with autoincrement ids.
+    """
+    table = IdSequence.__table__
+    highest = select(func.coalesce(func.max(ChatMessage.id), 0)).scalar_subquery()
+    start = case((table.c.last_value < highest, highest), else_=table.c.last_value)
+    increment = table.update().where(table.c.name == SEQUENCE).values(last_value=start + count)
+    select_last = db.select(table.c.last_value).where(table.c.name == SEQUENCE)
+
+    with db.engine.begin() as conn:
+        if conn.execute(increment).rowcount:
+            last = conn.execute(select_last).scalar()
+            return last - count + 1, last
+
+    try:
+        with db.engine.begin() as conn:
+            last = conn.execute(select(func.coalesce(func.max(ChatMessage.id), 0))).scalar() + count
+            conn.execute(table.insert().values(name=SEQUENCE, last_value=last))
+            return last - count + 1, last
+    except IntegrityError:
+        # Another worker created it first
+        with db.engine.begin() as conn:
+            conn.execute(increment)
+            last = conn.execute(select_last).scalar()
+            return last - count + 1, last
+
+class ChatWriter:
+    """Queue of chat messages written to the database in batches."""
+
+    def __init__(self, app):
+        self.app = app
+        self.interval = app.config['CHAT_WRITE_INTERVAL']
+        self.batch_size = app.config['CHAT_WRITE_BATCH']
+        self.max_block_size = app.config['CHAT_ID_BLOCK_SIZE']
+        self._block_size = 1
+        self._lock = Lock()        # Guards the queue and the id block
+        self._flush_lock = Lock()  # One batch written at a time, in id order
+        self._pending = []
+        self._block = None  # [next id, last id, reserved at]
+        self._running = True
+        self._started = False
+
+    def _next_id(self):
+        block = self._block
+        now = time.monotonic()
+        if not block or block[0] > block[1] or now - block[2] > ID_BLOCK_TTL:
+            if block:
+                self._block_size = self._resize(block, now)
+            first, last = reserve_ids(self._block_size)
+            block = self._block = [first, last, now]
+        block[0] += 1
+        return block[0] - 1
+
+    def _resize(self, block, now):
+        """Size of the next block: doubled if the last one ran out in time, else one id."""
+        if block[0] > block[1] and now - block[2] <= ID_BLOCK_TTL:
+            return min(self._block_size * 2, self.max_block_size)
+        return 1
+
+    def submit(self, sender_id, receiver_id, content):
+        """Queue a message and return it as a dict with its id and timestamp."""
+        with self._lock:
+            if not self._started:
+                self._started = True
+                socketio.start_background_task(self._run)
+            message = {
+                'id': self._next_id(),
+                'sender_id': sender_id,
+                'receiver_id': receiver_id,
+                'content': content,
+                'timestamp': datetime.utcnow(),
+                'read': False,
+            }
+            self._pending.append(message)
+            full = len(self._pending) >= self.batch_size
+
+        if full:
+            self.flush()
+        return message
+
+    def flush(self):
+        """Write every queued message in one transaction. Returns how many were written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                db.session.execute(insert(ChatMessage), batch)
+                conversations.record_messages(batch)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                # Keep them queued, ahead of the newer messages
+                with self._lock:
+                    self._pending = batch + self._pending
+                raise
+            return len(batch)
+
+    def _run(self):
+        """Background task: flush the queue every interval, retrying while the database fails."""
+        failures = 0
+        while self._running:
+            socketio.sleep(RETRY_DELAYS[min(failures, len(RETRY_DELAYS) - 1)] if failures else self.interval)
+            with self.app.app_context():
+                try:
+                    self.flush()
+                    failures = 0
+                except Exception as e:
+                    failures += 1
+                    print(f'Error writing chat messages ({len(self._pending)} queued): {e!r}')
+
+    def close(self):
+        """Stop the background task and write what is still queued."""
+        self._running = False
+        with self.app.app_context():
+            for delay in RETRY_DELAYS:
+                try:
+                    self.flush()
+                    return
+                except Exception as e:
+                    print(f'Error writing chat messages at shutdown: {e!r}')
+                    time.sleep(delay)
+            print(f'❌ {len(self._pending)} chat messages could not be saved')
+
+_writer_lock = Lock()
+_writer = None
+
+def get_writer():
+    """Return this process's ChatWriter, or None if CHAT_WRITE_BUFFER is off."""
+    global _writer
+    if not current_app.config.get('CHAT_WRITE_BUFFER'):
+        return None
+    with _writer_lock:
+        if _writer is None:
+            _writer = ChatWriter(current_app._get_current_object())
+            atexit.register(_writer.close)
+        return _writer
+
+def save_message(sender_id, receiver_id, content):
+    """
+    Store a chat message and count it in its conversation. Returns
+    (id, timestamp); with the buffer on the row is written shortly after.
+    """
+    writer = get_writer()
+    if writer:
+        message = writer.submit(sender_id, receiver_id, content)
+        return message['id'], message['timestamp']
+
+    message = ChatMessage(sender_id=sender_id, receiver_id=receiver_id, content=content)
+    db.session.add(message)
+    db.session.flush()
+    conversations.record_message(message)
+    db.session.commit()
+    return message.id, message.timestamp
+
+def sync():
+    """Write any buffered messages now, before reading or updating them."""
+    writer = get_writer()
+    if writer:
+        try:
+            writer.flush()
+        except Exception as e:
+            # Still queued; the background task retries
+            print(f'Error writing chat messages: {e!r}')
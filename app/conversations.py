@@ -0,0 +1,173 @@
+"""
+Chat conversations: one row per pair of users with its last message and the
+unread count of each participant.
+
+Rows are written in the same transaction as the chat messages they describe,
+so unread badges and the list of recent conversations are read from a few
+rows per user instead of scanning the chat_message table.
+"""
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import ChatMessage, ChatMessageArchive, Conversation
+
+def pair(user_id, other_id):
+    """Return the (user_a_id, user_b_id) key of the conversation between two users."""
+    return (user_id, other_id) if user_id < other_id else (other_id, user_id)
+
+def _unread_column(user_id, key):
+    """The unread counter of user_id's side of a conversation."""
+    return Conversation.unread_a if user_id == key[0] else Conversation.unread_b
+
+def _where(key):
+    return (Conversation.user_a_id == key[0], Conversation.user_b_id == key[1])
+
+def record_message(message):
+    """
+    Count a new (flushed) message in its conversation: one more unread for
+    the receiver, and the last message pointer if it is the newest. Does not
+    commit; runs inside the caller's transaction.
+    """
+    record_messages([{
+        'id': message.id,
+        'sender_id': message.sender_id,
+        'receiver_id': message.receiver_id,
+        'timestamp': message.timestamp,
+    }])
+
+def record_messages(messages):
+    """record_message() for a batch of message dicts, with one upsert per conversation."""
+    changes = {}  # {key: [unread_a, unread_b, newest message]}
+    for message in messages:
+        key = pair(message['sender_id'], message['receiver_id'])
+        change = changes.setdefault(key, [0, 0, message])
+        change[0 if message['receiver_id'] == key[0] else 1] += 1
+        if message['id'] > change[2]['id']:
+            change[2] = message
+
+    for key, (unread_a, unread_b, last) in changes.items():
+        _upsert(key, unread_a, unread_b, last['id'], last['timestamp'])
+
+def _upsert(key, unread_a, unread_b, last_id, last_at):
+    # Messages of concurrent transactions can arrive out of id order
+    newer = func.coalesce(Conversation.last_message_id, 0) < last_id
+    # MySQL evaluates SET left to right, so last_message_at goes before the id it compares
+    values = [
+        (Conversation.last_message_at, case((newer, last_at), else_=Conversation.last_message_at)),
+        (Conversation.last_message_id, case((newer, last_id), else_=Conversation.last_message_id)),
+    ]
+    if unread_a:
+        values.append((Conversation.unread_a, Conversation.unread_a + unread_a))
+    if unread_b:
+        values.append((Conversation.unread_b, Conversation.unread_b + unread_b))
+    stmt = update(Conversation).where(*_where(key)).ordered_values(*values)
+    if db.session.execute(stmt).rowcount:
+        return
+
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(Conversation).values(
+                user_a_id=key[0], user_b_id=key[1], last_message_id=last_id, last_message_at=last_at,
+                unread_a=unread_a, unread_b=unread_b))
+    except IntegrityError:
+        # Another transaction created the conversation first
+        db.session.execute(stmt)
+
+def mark_read(user_id, other_id):
+    """
+    Mark everything other_id sent to user_id as read and set user_id's unread
+    counter to what is still unread. Does not commit.
+    """
+    ChatMessage.query.filter_by(
+        sender_id=other_id,
+        receiver_id=user_id,
+        read=False
+    ).update({'read': True}, synchronize_session=False)
+
+    # Counted in the same statement, not reset to 0: a message recorded by another
+    # transaction since the UPDATE above is unread and stays in the counter
+    remaining = select(func.count()).select_from(ChatMessage).where(
+        ChatMessage.receiver_id == user_id, ChatMessage.read == False,
+        ChatMessage.sender_id == other_id).scalar_subquery()
+    key = pair(user_id, other_id)
+    db.session.execute(update(Conversation).where(*_where(key)).values({_unread_column(user_id, key): remaining}))
+
+# (own column, other user column, own unread counter) for both sides a user can be on
+SIDES = (
+    (Conversation.user_a_id, Conversation.user_b_id, Conversation.unread_a),
+    (Conversation.user_b_id, Conversation.user_a_id, Conversation.unread_b),
+)
+
+def unread_counts(user_id):
+    """Return {other user id: unread messages} of a user's conversations with unread messages."""
+    counts = {}
+    for own, other, unread in SIDES:
+        rows = db.session.execute(select(other, unread).where(own == user_id, unread > 0))
+        counts.update(rows.all())
+    return counts
+
+def recent_conversations(user_id, limit=50):
+    """
+    Return a user's conversations, most recent first, as dicts with the other
+    user id, the last message id and time, and the user's unread count.
+    """
+    conversations = []
+    for own, other, unread in SIDES:
+        rows = db.session.execute(
+            select(other, Conversation.last_message_id, Conversation.last_message_at, unread)
+            .where(own == user_id, Conversation.last_message_at.is_not(None))
+            .order_by(Conversation.last_message_at.desc())
+            .limit(limit))
+        conversations += rows.all()
+    conversations.sort(key=lambda row: row[2], reverse=True)
+
+    return [{
+        'user_id': other_id,
+        'last_message_id': last_message_id,
+        'last_message_at': last_message_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'unread': unread,
+    } for other_id, last_message_id, last_message_at, unread in conversations[:limit]]
+
+def rebuild():
+    """
+    Recompute every conversation from the chat_message table and its archive
+    with a GROUP BY on each. Returns the number of conversations written.
+    """
+    totals = {}  # {(user_a_id, user_b_id): [last message id, unread_a, unread_b]}
+    for model in (ChatMessage, ChatMessageArchive):
+        for user_a_id, user_b_id, last_id, unread_a, unread_b in _pair_totals(model):
+            total = totals.setdefault((user_a_id, user_b_id), [last_id, 0, 0])
+            total[0] = max(total[0], last_id)
+            total[1] += unread_a or 0
+            total[2] += unread_b or 0
+
+    # Timestamps of the last messages, looked up by primary key in chunks
+    timestamps = {}
+    last_ids = [total[0] for total in totals.values()]
+    for model in (ChatMessage, ChatMessageArchive):
+        missing = [id for id in last_ids if id not in timestamps]
+        for start in range(0, len(missing), 1000):
+            timestamps.update(db.session.execute(
+                select(model.id, model.timestamp)
+                .where(model.id.in_(missing[start:start + 1000]))).all())
+
+    Conversation.query.delete()
+    for (user_a_id, user_b_id), (last_message_id, unread_a, unread_b) in totals.items():
+        db.session.add(Conversation(
+            user_a_id=user_a_id, user_b_id=user_b_id,
+            last_message_id=last_message_id, last_message_at=timestamps.get(last_message_id),
+            unread_a=unread_a, unread_b=unread_b))
+    db.session.commit()
+
+    return len(totals)
+
+def _pair_totals(model):
+    """(user_a_id, user_b_id, last message id, unread_a, unread_b) of every pair in a message table."""
+    user_a = case((model.sender_id < model.receiver_id, model.sender_id), else_=model.receiver_id)
+    user_b = case((model.sender_id < model.receiver_id, model.receiver_id), else_=model.sender_id)
+    unread = model.read == False
+    return db.session.execute(select(
+        user_a, user_b, func.max(model.id),
+        func.sum(case(((model.receiver_id == user_a) & unread, 1), else_=0)),
+        func.sum(case(((model.receiver_id == user_b) & unread, 1), else_=0)),
+    ).group_by(user_a, user_b)).all()
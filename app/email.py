@@ -1,26 +1,8 @@
-from flask import render_template_string
-from flask_mail import Message
-from threading import Thread
-from app import mail
-
-def send_async_email(app, msg):
-    """Send email asynchronously"""
-    with app.app_context():
-        try:
-            mail.send(msg)
-        except Exception as e:
-            print(f"Error sending email: {e}")
+from app import email_outbox
 
 def send_email(subject, recipient, text_body, html_body=None):
-    """Send email with optional HTML body"""
-    from flask import current_app
-    msg = Message(subject, recipients=[recipient])
-    msg.body = text_body
-    if html_body:
-        msg.html = html_body
-    
-    # Send asynchronously
-    Thread(target=send_async_email, args=(current_app._get_current_object(), msg)).start()
+    """Queue an email with optional HTML body in the outbox (see app/email_outbox.py)"""
+    email_outbox.enqueue(subject, recipient, text_body, html_body)
 
 def send_ticket_assigned_email(ticket, assigned_user):
     """Send notification when ticket is assigned"""
@@ -82,6 +64,52 @@ Help Desk System
     
     send_email(subject, recipient.email, text_body, html_body)
 
+def send_chat_digest_email(recipient, senders, previews):
+    """
+    Send one notification for several chat messages received while offline.
+    senders is a list of (user, unread count), previews of (user, text) for
+    the latest messages.
+    """
+    total = sum(count for _, count in senders)
+    names = ', '.join(sender.username for sender, _ in senders)
+    subject = f'{total} mensajes nuevos de {names}' if len(senders) <= 3 else f'{total} mensajes nuevos de {len(senders)} usuarios'
+    
+    sender_lines = '\n'.join(f'- {sender.username}: {count}' for sender, count in senders)
+    preview_lines = '\n'.join(f'{sender.username}: "{text}"' for sender, text in previews)
+    text_body = f'''Hola {recipient.username},
+
+Tienes {total} mensajes sin leer:
+
+{sender_lines}
+
+Últimos mensajes:
+
+{preview_lines}
+
+Inicia sesión para ver los mensajes completos.
+
+Saludos,
+Help Desk System
+'''
+    
+    sender_items = ''.join(f'<li><strong>{sender.username}</strong>: {count}</li>' for sender, count in senders)
+    preview_items = ''.join(
+        f'''<blockquote style="border-left: 3px solid #ccc; padding-left: 10px; color: #666;">
+        <strong>{sender.username}:</strong> {text}
+    </blockquote>''' for sender, text in previews)
+    html_body = f'''
+    <h2>Mensajes Nuevos</h2>
+    <p>Hola <strong>{recipient.username}</strong>,</p>
+    <p>Tienes {total} mensajes sin leer:</p>
+    <ul>{sender_items}</ul>
+    <p>Últimos mensajes:</p>
+    {preview_items}
+    <p>Inicia sesión para ver los mensajes completos.</p>
+    <p>Saludos,<br>Help Desk System</p>
+    '''
+    
+    send_email(subject, recipient.email, text_body, html_body)
+
 def send_ticket_comment_email(ticket, commenter, comment_content, recipient):
     """Send notification when someone comments on a ticket"""
     subject = f'Nuevo comentario en Ticket #{ticket.id}'
@@ -0,0 +1,292 @@
+"""
+Persistent email outbox, drained by a fixed pool of sender threads.
+
+send_email() only inserts a row in the email_outbox table, so a burst of
+notifications costs one INSERT each instead of one thread and one SMTP
+handshake each, and nothing is lost if sending fails or the process stops.
+EMAIL_WORKERS threads per process claim up to EMAIL_BATCH rows at a time and
+send them over an SMTP connection (mail.connect()) that each thread keeps
+open for EMAIL_SMTP_IDLE seconds after its last batch, so steady traffic
+reuses it instead of connecting once per email. A failed message is retried
+after RETRY_DELAYS, and marked 'failed' after EMAIL_MAX_ATTEMPTS.
+
+Rows are claimed with an UPDATE on their status, so several processes can
+drain the same table; rows left 'sending' by a process that died are claimed
+again after SENDING_TIMEOUT. A batch still sending renews its claim every
+CLAIM_REFRESH seconds, so a slow server does not get its rows sent twice.
+The pool is started with the app (run.py, wsgi.py) so rows queued before a
+restart and scheduled retries are sent without waiting for a new email.
+"""
+import smtplib
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from threading import Event, Lock
+from flask import current_app
+from flask_mail import Message
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+from app import db, mail, socketio
+from app.models import EmailOutbox
+
+RETRY_DELAYS = (30, 120, 600, 1800)  # Seconds before the 2nd, 3rd... attempt
+SENDING_TIMEOUT = timedelta(minutes=5)
+CLAIM_REFRESH = 60  # Seconds between renewals of a batch's claim while sending
+RETENTION = timedelta(days=7)  # How long sent and failed rows are kept
+CLEANUP_INTERVAL = 600
+RATE_WINDOW = 60  # Seconds over which the send rate is measured
+
+def enqueue(subject, recipient, text_body, html_body=None):
+    """Store an email in the outbox and wake the sender pool."""
+    now = datetime.utcnow()
+    # Own transaction: the email is queued even if the caller's session rolls back
+    with db.engine.begin() as conn:
+        conn.execute(insert(EmailOutbox).values(
+            subject=subject, recipient=recipient, text_body=text_body, html_body=html_body,
+            status='pending', attempts=0, created_at=now, next_attempt_at=now))
+    get_pool().wake()
+
+def _ready(now):
+    return or_(
+        and_(EmailOutbox.status == 'pending', EmailOutbox.next_attempt_at <= now),
+        and_(EmailOutbox.status == 'sending', EmailOutbox.claimed_at < now - SENDING_TIMEOUT))
+
+def claim(limit):
+    """Mark up to limit due emails as being sent by this caller and return their rows."""
+    now = datetime.utcnow()
+    token = uuid.uuid4().hex
+    with db.engine.begin() as conn:
+        ids = conn.execute(select(EmailOutbox.id).where(_ready(now))
+                           .order_by(EmailOutbox.id).limit(limit)).scalars().all()
+        if not ids:
+            return []
+        # Rows another process claimed in between no longer match _ready()
+        conn.execute(update(EmailOutbox).where(EmailOutbox.id.in_(ids), _ready(now))
+                     .values(status='sending', claimed_by=token, claimed_at=now))
+        return conn.execute(select(EmailOutbox).where(
+            EmailOutbox.id.in_(ids), EmailOutbox.claimed_by == token)).all()
+
+def _message(row):
+    msg = Message(row.subject, recipients=[row.recipient])
+    msg.body = row.text_body
+    if row.html_body:
+        msg.html = row.html_body
+    return msg
+
+class SmtpSession:
+    """An SMTP connection kept open between batches."""
+
+    def __init__(self):
+        self.conn = None
+        self.last_used = 0
+
+    def open(self):
+        """Return the open connection, checked with a NOOP, or a new one."""
+        if self.conn is not None:
+            try:
+                if self.conn.host is not None:  # None when MAIL_SUPPRESS_SEND
+                    self.conn.host.noop()
+                return self.conn
+            except (smtplib.SMTPException, OSError):
+                self.close()  # Closed by the server while idle
+        conn = mail.connect()
+        conn.__enter__()
+        self.conn = conn
+        return conn
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.__exit__(None, None, None)
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.conn = None
+
+    def close_if_idle(self, idle):
+        """Close the connection once unused for idle seconds. Returns the seconds left, or None."""
+        if self.conn is None:
+            return None
+        left = self.last_used + idle - time.monotonic()
+        if left <= 0:
+            self.close()
+            return None
+        return left
+
+def send_batch(rows, session=None):
+    """
+    Send claimed rows over the session's SMTP connection (a new one that is
+    closed afterwards if no session is given) and record the outcome of
+    each. Returns (sent, failed) counts.
+    """
+    own_session = session is None
+    session = session or SmtpSession()
+    sent, failed = [], []
+    remaining = list(rows)
+    refreshed = time.monotonic()
+    try:
+        conn = session.open()
+        while remaining:
+            row = remaining[0]
+            if time.monotonic() - refreshed > CLAIM_REFRESH:
+                _refresh_claim(row.claimed_by)
+                refreshed = time.monotonic()
+            try:
+                conn.send(_message(row))
+                sent.append(row.id)
+            except smtplib.SMTPServerDisconnected:
+                raise  # The connection is gone, not this message
+            except smtplib.SMTPException as e:
+                failed.append((row, e))  # Refused by the server
+            except OSError:
+                raise  # Socket error (SMTPException is an OSError too, so it goes first)
+            except Exception as e:
+                failed.append((row, e))
+            remaining.pop(0)
+    except Exception as e:
+        # Could not connect or lost the connection: retry what was not sent
+        failed += [(row, e) for row in remaining]
+        session.close()
+    finally:
+        session.last_used = time.monotonic()
+        if own_session:
+            session.close()
+
+    now = datetime.utcnow()
+    with db.engine.begin() as conn:
+        if sent:
+            conn.execute(update(EmailOutbox).where(EmailOutbox.id.in_(sent))
+                         .values(status='sent', sent_at=now, claimed_by=None, last_error=None))
+        for row, error in failed:
+            attempts = row.attempts + 1
+            given_up = attempts >= current_app.config['EMAIL_MAX_ATTEMPTS']
+            delay = RETRY_DELAYS[min(attempts, len(RETRY_DELAYS)) - 1]
+            conn.execute(update(EmailOutbox).where(EmailOutbox.id == row.id).values(
+                status='failed' if given_up else 'pending', attempts=attempts, claimed_by=None,
+                next_attempt_at=now + timedelta(seconds=delay), last_error=repr(error)[:1000]))
+            print(f'Error sending email {row.id} to {row.recipient} (attempt {attempts}): {error!r}')
+    return len(sent), len(failed)
+
+def _refresh_claim(token):
+    """Keep the rows of a batch that is still sending from being claimed again."""
+    with db.engine.begin() as conn:
+        conn.execute(update(EmailOutbox).where(EmailOutbox.claimed_by == token, EmailOutbox.status == 'sending')
+                     .values(claimed_at=datetime.utcnow()))
+
+def drain():
+    """Send every due email from the calling thread (scripts). Returns (sent, failed)."""
+    totals = [0, 0]
+    while rows := claim(current_app.config['EMAIL_BATCH']):
+        for i, count in enumerate(send_batch(rows)):
+            totals[i] += count
+    return tuple(totals)
+
+def cleanup():
+    """Delete sent and failed rows older than RETENTION."""
+    with db.engine.begin() as conn:
+        conn.execute(delete(EmailOutbox).where(
+            EmailOutbox.status.in_(('sent', 'failed')), EmailOutbox.created_at < datetime.utcnow() - RETENTION))
+
+class EmailWorkerPool:
+    """EMAIL_WORKERS background tasks of this process that send the outbox."""
+
+    def __init__(self, app):
+        self.app = app
+        self.size = app.config['EMAIL_WORKERS']
+        self._wakeup = Event()
+        self._lock = Lock()  # Guards the metrics
+        self._sent_times = deque()
+        self.sent = 0
+        self.failed = 0
+        self.batches = 0
+        self._last_cleanup = time.monotonic()
+
+    def start(self):
+        for _ in range(self.size):
+            socketio.start_background_task(self._run)
+
+    def wake(self):
+        self._wakeup.set()
+
+    def _run(self):
+        session = SmtpSession()
+        while True:
+            self._wakeup.clear()
+            with self.app.app_context():
+                try:
+                    rows = claim(self.app.config['EMAIL_BATCH'])
+                    if rows:
+                        self._record(*send_batch(rows, session))
+                        continue
+                    self._maybe_cleanup()
+                except Exception as e:
+                    print(f'Error draining the email outbox: {e!r}')
+            # Idle: wait for a new email, or poll for retries and other processes' rows.
+            # The SMTP connection stays open for the next email until EMAIL_SMTP_IDLE passes.
+            timeout = self.app.config['EMAIL_POLL']
+            left = session.close_if_idle(self.app.config['EMAIL_SMTP_IDLE'])
+            self._wakeup.wait(min(timeout, left) if left else timeout)
+
+    def _record(self, sent, failed):
+        now = time.monotonic()
+        with self._lock:
+            self.sent += sent
+            self.failed += failed
+            self.batches += 1
+            self._sent_times.extend([now] * sent)
+            while self._sent_times and self._sent_times[0] < now - RATE_WINDOW:
+                self._sent_times.popleft()
+
+    def _maybe_cleanup(self):
+        with self._lock:
+            if time.monotonic() - self._last_cleanup < CLEANUP_INTERVAL:
+                return
+            self._last_cleanup = time.monotonic()
+        cleanup()
+
+    def metrics(self):
+        now = time.monotonic()
+        with self._lock:
+            recent = sum(1 for t in self._sent_times if t >= now - RATE_WINDOW)
+            return {
+                'workers': self.size,
+                'sent': self.sent,
+                'failed_attempts': self.failed,
+                'batches': self.batches,
+                'sent_per_minute': recent * 60 / RATE_WINDOW,
+            }
+
+_pool_lock = Lock()
+_pool = None
+
+def start(app):
+    """Start this process's sender pool, if it is not running yet, and return it."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = EmailWorkerPool(app)
+            _pool.start()
+        return _pool
+
+def get_pool():
+    """Return this process's sender pool, starting it on first use."""
+    return start(current_app._get_current_object())
+
+def stats():
+    """Queue depth by status (all processes) plus this process's sender metrics."""
+    now = datetime.utcnow()
+    with db.engine.connect() as conn:
+        depth = dict(conn.execute(select(EmailOutbox.status, func.count())
+                                  .group_by(EmailOutbox.status)).all())
+        oldest = conn.execute(select(func.min(EmailOutbox.created_at))
+                              .where(EmailOutbox.status == 'pending')).scalar()
+        sent_last_minute = conn.execute(select(func.count()).select_from(EmailOutbox).where(
+            EmailOutbox.status == 'sent', EmailOutbox.sent_at >= now - timedelta(seconds=RATE_WINDOW))).scalar()
+    return {
+        'pending': depth.get('pending', 0),
+        'sending': depth.get('sending', 0),
+        'failed': depth.get('failed', 0),
+        'sent': depth.get('sent', 0),
+        'oldest_pending_seconds': (now - oldest).total_seconds() if oldest else 0,
+        'sent_last_minute': sent_last_minute,  # Every process
+        'process': _pool.metrics() if _pool else None,
+    }
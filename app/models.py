@@ -56,6 +56,8 @@ class Ticket(db.Model):
     status = db.Column(db.String(20), default='abierto') # 'abierto', 'en_proceso', 'cerrado'
     priority = db.Column(db.String(20), default='media') # 'alta', 'media', 'baja'
     created_at = db.Column(db.DateTime, index=True, default=datetime.utcnow)
+    # Last change, for incremental exports (/export/parquet?since=...)
+    updated_at = db.Column(db.DateTime, index=True, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     created_by_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     assigned_to_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
@@ -64,31 +66,103 @@ class Ticket(db.Model):
 
     created_by = db.relationship('User', foreign_keys=[created_by_id], backref='tickets_created')
     assigned_to = db.relationship('User', foreign_keys=[assigned_to_id], backref='tickets_assigned')
+
+    # Role-scoped access paths: technicians filter by assignee, users by creator,
+    # then by status/priority or ordered by date (lists and exports)
+    __table_args__ = (
+        db.Index('ix_ticket_assigned_status_priority', 'assigned_to_id', 'status', 'priority'),
+        db.Index('ix_ticket_creator_status_priority', 'created_by_id', 'status', 'priority'),
+        db.Index('ix_ticket_assigned_created', 'assigned_to_id', 'created_at'),
+        db.Index('ix_ticket_creator_created', 'created_by_id', 'created_at'),
+        db.Index('ix_ticket_status_created', 'status', 'created_at'),
+        # Full-text search (on SQLite an FTS5 table is used instead, see app/ticket_search.py)
+        db.Index('ft_ticket_title_description', 'title', 'description', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
     
     @staticmethod
     def generate_ticket_number():
         """Generate correlative ticket number in format TKT-YYYY-NNNNN"""
-        from datetime import datetime
-        year = datetime.utcnow().year
-        
-        # Get the last ticket of the current year
-        last_ticket = Ticket.query.filter(
-            Ticket.ticket_number.like(f'TKT-{year}-%')
-        ).order_by(Ticket.id.desc()).first()
-        
-        if last_ticket and last_ticket.ticket_number:
-            # Extract the sequence number and increment
-            last_num = int(last_ticket.ticket_number.split('-')[2])
-            new_num = last_num + 1
-        else:
-            # First ticket of the year
-            new_num = 1
-        
-        return f'TKT-{year}-{new_num:05d}'
+        from app.ticket_numbers import next_ticket_number
+        return next_ticket_number()
 
     def __repr__(self):
         return f'<Ticket {self.ticket_number or self.id}>'
 
+class TicketSequence(db.Model):
+    """Last ticket number handed out for a year"""
+    year = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    last_value = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<TicketSequence {self.year}: {self.last_value}>'
+
+class IdSequence(db.Model):
+    """Last id handed out from a named sequence (ids reserved in blocks by the workers)"""
+    name = db.Column(db.String(50), primary_key=True)
+    last_value = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<IdSequence {self.name}: {self.last_value}>'
+
+class TicketStatCounter(db.Model):
+    """Precomputed dashboard counters for one scope (global, assignee or creator)"""
+    scope = db.Column(db.String(20), primary_key=True)  # 'global', 'assignee', 'creator'
+    scope_id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # User id, 0 for global
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+    # Status buckets
+    abierto = db.Column(db.Integer, nullable=False, default=0)
+    en_proceso = db.Column(db.Integer, nullable=False, default=0)
+    cerrado = db.Column(db.Integer, nullable=False, default=0)
+
+    # Priority buckets
+    alta = db.Column(db.Integer, nullable=False, default=0)
+    media = db.Column(db.Integer, nullable=False, default=0)
+    baja = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<TicketStatCounter {self.scope}:{self.scope_id}>'
+
+class TicketDailyRollup(db.Model):
+    """Per-day ticket activity for one analytics bucket"""
+    dimension = db.Column(db.String(20), primary_key=True)  # 'all', 'priority', 'assignee'
+    bucket = db.Column(db.String(64), primary_key=True)  # '' for all, priority name or assignee id ('0' = unassigned)
+    day = db.Column(db.Date, primary_key=True)
+    created = db.Column(db.Integer, nullable=False, default=0)
+    closed = db.Column(db.Integer, nullable=False, default=0)
+    backlog_delta = db.Column(db.Integer, nullable=False, default=0)  # Net change of non-closed tickets
+
+    def __repr__(self):
+        return f'<TicketDailyRollup {self.dimension}:{self.bucket} {self.day}>'
+
+class DataVersion(db.Model):
+    """Version of a data set, bumped on every write to it to invalidate caches"""
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DataVersion {self.name}: {self.value}>'
+
+class PresenceSession(db.Model):
+    """A Socket.IO connection of a user, shared by every worker process"""
+    sid = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    worker = db.Column(db.String(100), nullable=False, index=True)
+    connected_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_seen = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<PresenceSession {self.sid} of {self.user_id}>'
+
+class SocketIOMessage(db.Model):
+    """Socket.IO event published for the other workers (database message queue)"""
+    id = db.Column(db.Integer, primary_key=True)
+    payload = db.Column(db.Text(16777215), nullable=False)  # MEDIUMTEXT on MySQL
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<SocketIOMessage {self.id}>'
+
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
@@ -98,6 +172,11 @@ class Comment(db.Model):
     
     user = db.relationship('User', backref='comments')
 
+    # Comments of a ticket in chronological order
+    __table_args__ = (
+        db.Index('ix_comment_ticket_created', 'ticket_id', 'created_at'),
+    )
+
 class ChatMessage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -108,10 +187,91 @@ class ChatMessage(db.Model):
     
     sender = db.relationship('User', foreign_keys=[sender_id], backref='messages_sent')
     receiver = db.relationship('User', foreign_keys=[receiver_id], backref='messages_received')
+
+    # Conversation history (sender/receiver pair, paged by id) and unread counts per receiver
+    __table_args__ = (
+        db.Index('ix_chat_message_pair_id', 'sender_id', 'receiver_id', 'id'),
+        db.Index('ix_chat_message_receiver_read_sender', 'receiver_id', 'read', 'sender_id'),
+        # Ids of archived messages are never handed out again (see app/chat_archive.py)
+        {'sqlite_autoincrement': True},
+    )
     
     def __repr__(self):
         return f'<ChatMessage from {self.sender_id} to {self.receiver_id}>'
 
+class ChatMessageArchive(db.Model):
+    """Chat message older than CHAT_RETENTION_DAYS, moved out of chat_message (see app/chat_archive.py)"""
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # Same id it had in chat_message
+    sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    receiver_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    timestamp = db.Column(db.DateTime)
+    read = db.Column(db.Boolean, default=False)
+
+    # Only read as history pages; compressed pages on MySQL (InnoDB)
+    __table_args__ = (
+        db.Index('ix_chat_message_archive_pair_id', 'sender_id', 'receiver_id', 'id'),
+        {'mysql_row_format': 'COMPRESSED'},
+    )
+
+    def __repr__(self):
+        return f'<ChatMessageArchive from {self.sender_id} to {self.receiver_id}>'
+
+class Conversation(db.Model):
+    """Chat between two users (user_a_id < user_b_id): its last message and unread counters"""
+    user_a_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True, autoincrement=False)
+    user_b_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True, autoincrement=False)
+    last_message_id = db.Column(db.Integer, nullable=True)
+    last_message_at = db.Column(db.DateTime, nullable=True)
+    unread_a = db.Column(db.Integer, nullable=False, default=0)  # Sent by b, not read by a yet
+    unread_b = db.Column(db.Integer, nullable=False, default=0)  # Sent by a, not read by b yet
+
+    # A user's conversations by recency, on either side of the pair
+    __table_args__ = (
+        db.Index('ix_conversation_a_last', 'user_a_id', 'last_message_at'),
+        db.Index('ix_conversation_b_last', 'user_b_id', 'last_message_at'),
+    )
+
+    def __repr__(self):
+        return f'<Conversation {self.user_a_id}-{self.user_b_id}>'
+
+class ChatEmailDigest(db.Model):
+    """Chat messages received by an offline user, waiting to be emailed as one digest"""
+    recipient_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True, autoincrement=False)
+    first_message_id = db.Column(db.Integer, nullable=False)
+    last_message_id = db.Column(db.Integer, nullable=False)
+    message_count = db.Column(db.Integer, nullable=False, default=1)
+    first_at = db.Column(db.DateTime, nullable=False, index=True)  # For the maximum delay
+    last_at = db.Column(db.DateTime, nullable=False, index=True)   # For the quiet period
+
+    def __repr__(self):
+        return f'<ChatEmailDigest for {self.recipient_id}: {self.message_count}>'
+
+class EmailOutbox(db.Model):
+    """Email waiting to be sent (or already sent) by the sender pool, see app/email_outbox.py"""
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(255), nullable=False)
+    recipient = db.Column(db.String(120), nullable=False)
+    text_body = db.Column(db.Text, nullable=False)
+    html_body = db.Column(db.Text, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # 'pending', 'sending', 'sent', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claimed_by = db.Column(db.String(32), nullable=True)  # Token of the batch sending it
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+
+    # Due emails of each status, and the send rate
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next', 'status', 'next_attempt_at'),
+        db.Index('ix_email_outbox_status_sent', 'status', 'sent_at'),
+    )
+
+    def __repr__(self):
+        return f'<EmailOutbox {self.id} to {self.recipient}: {self.status}>'
+
 class AuditLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
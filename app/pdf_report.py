@@ -0,0 +1,227 @@
+"""
+Streaming PDF table reports.
+
+Writes a paginated table straight to a file: each page is laid out, compressed
+and written as soon as it is full, so only one page is ever held in memory and
+the document is never built twice. Text uses the PDF core fonts (Helvetica,
+WinAnsi encoding), cells wrap their text and the table header is repeated on
+every page.
+"""
+import io
+import zlib
+from functools import lru_cache
+from fpdf.fonts import CORE_FONTS_CHARWIDTHS
+
+MM = 72 / 25.4  # Points per millimetre
+PAGE_WIDTH, PAGE_HEIGHT = 210 * MM, 297 * MM  # A4 portrait
+MARGIN = 10 * MM
+
+FONT_SIZE = 9
+LINE_HEIGHT = 4.2 * MM
+CELL_PADDING = 1.2 * MM
+LOGO_MAX_PIXELS = 300  # Logo is downscaled to this width before embedding
+
+def _encode(text):
+    return str(text).encode('cp1252', errors='replace')
+
+def _escape(raw):
+    return raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+# Glyph widths (1/1000 of the font size) indexed by byte value
+_WIDTHS = {bold: [CORE_FONTS_CHARWIDTHS['helveticaB' if bold else 'helvetica'][chr(i)] for i in range(256)]
+           for bold in (False, True)}
+
+def text_width(raw, font_size, bold=False):
+    """Width in points of cp1252 encoded text."""
+    return sum(map(_WIDTHS[bold].__getitem__, raw)) * font_size / 1000
+
+@lru_cache(maxsize=4096)  # Statuses, priorities and usernames repeat on every page
+def wrap(text, width, font_size, bold=False):
+    """Split text into encoded lines that fit in width points, breaking long words."""
+    raw = _encode(text)
+    widths = _WIDTHS[bold]
+    limit = width * 1000 / font_size
+    space = widths[ord(' ')]
+
+    lines = []
+    for paragraph in raw.split(b'\n'):
+        line, line_width = [], 0
+        for word in paragraph.split(b' '):
+            word_width = sum(map(widths.__getitem__, word))
+            if line and line_width + space + word_width <= limit:
+                line.append(word)
+                line_width += space + word_width
+                continue
+            if line:
+                lines.append(b' '.join(line))
+            if word_width <= limit:
+                line, line_width = [word], word_width
+                continue
+            # A word wider than the cell is cut wherever it overflows
+            start, line_width = 0, 0
+            for i, byte in enumerate(word):
+                if i > start and line_width + widths[byte] > limit:
+                    lines.append(word[start:i])
+                    start, line_width = i, 0
+                line_width += widths[byte]
+            line = [word[start:]]
+        lines.append(b' '.join(line))
+    return lines
+
+class PdfTableWriter:
+    """
+    Write a table report to a binary file, one page at a time.
+
+        writer = PdfTableWriter(output, headers, widths_mm, title='...', logo_path=...)
+        for row in rows:
+            writer.add_row(row)
+        writer.close()
+    """
+
+    def __init__(self, output, headers, widths_mm, title=None, subtitle=None, logo_path=None, align=None):
+        self.output = output
+        self.headers = headers
+        self.widths = [w * MM for w in widths_mm]
+        self.align = align or ['C'] * len(headers)
+        self.offsets = {}
+        self.position = 0
+        self.page_ids = []
+        self.next_id = 6  # 1-5 are reserved: catalog, pages, two fonts and the logo
+        self.content = None
+        self.page_number = 0
+
+        self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        self._write_object(3, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+        self._write_object(4, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>')
+        self.logo = self._write_logo(logo_path) if logo_path else None
+
+        self._new_page()
+        self._draw_title(title, subtitle)
+        self._draw_header()
+
+    # Low level output
+    def _write(self, data):
+        self.output.write(data)
+        self.position += len(data)
+
+    def _write_object(self, obj_id, body):
+        self.offsets[obj_id] = self.position
+        self._write(b'%d 0 obj\n' % obj_id + body + b'\nendobj\n')
+
+    def _write_stream(self, obj_id, data, extra=b''):
+        data = zlib.compress(data)
+        self._write_object(obj_id, b'<< /Length %d /Filter /FlateDecode%s >>\nstream\n' % (len(data), extra)
+                           + data + b'\nendstream')
+
+    def _reserve_id(self):
+        obj_id = self.next_id
+        self.next_id += 1
+        return obj_id
+
+    def _write_logo(self, path):
+        """Embed the logo as an RGB image flattened on white. Returns its size in pixels."""
+        try:
+            from PIL import Image
+            image = Image.open(path)
+        except Exception:
+            return None
+        image.thumbnail((LOGO_MAX_PIXELS, LOGO_MAX_PIXELS))
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image.convert('RGBA'), mask=image.convert('RGBA'))
+        width, height = background.size
+        self._write_stream(5, background.tobytes(),
+                           b' /Type /XObject /Subtype /Image /Width %d /Height %d'
+                           b' /ColorSpace /DeviceRGB /BitsPerComponent 8' % (width, height))
+        return width, height
+
+    # Pages
+    def _new_page(self):
+        if self.content is not None:
+            self._finish_page()
+        self.page_number += 1
+        self.content = io.BytesIO()
+        self.y = MARGIN
+
+    def _finish_page(self):
+        footer = _encode(f'Página {self.page_number}')
+        x = (PAGE_WIDTH - text_width(footer, 8)) / 2
+        self._text(footer, x, PAGE_HEIGHT - MARGIN / 2, 8)
+
+        content_id, page_id = self._reserve_id(), self._reserve_id()
+        self._write_stream(content_id, self.content.getvalue())
+        resources = b'/Font << /F1 3 0 R /F2 4 0 R >>'
+        if self.logo:
+            resources += b' /XObject << /I1 5 0 R >>'
+        self._write_object(page_id, b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] '
+                           b'/Resources << %s >> /Contents %d 0 R >>'
+                           % (PAGE_WIDTH, PAGE_HEIGHT, resources, content_id))
+        self.page_ids.append(page_id)
+        self.content = None
+
+    # Drawing, y grows downwards from the top of the page
+    def _text(self, raw, x, baseline, size, bold=False):
+        self.content.write(b'BT /%s %d Tf %.2f %.2f Td (%s) Tj ET\n'
+                           % (b'F2' if bold else b'F1', size, x, PAGE_HEIGHT - baseline, _escape(raw)))
+
+    def _draw_title(self, title, subtitle):
+        x = MARGIN
+        if self.logo:
+            width = 20 * MM
+            height = width * self.logo[1] / self.logo[0]
+            self.content.write(b'q %.2f 0 0 %.2f %.2f %.2f cm /I1 Do Q\n'
+                               % (width, height, MARGIN, PAGE_HEIGHT - MARGIN - height))
+            x += width + 5 * MM
+        if title:
+            self._text(_encode(title), x, self.y + 7 * MM, 20, bold=True)
+        if subtitle:
+            self._text(_encode(subtitle), x, self.y + 13 * MM, 14, bold=True)
+        self.y += 20 * MM
+
+    def _draw_row(self, values, bold=False, fill=False):
+        """Draw one row, starting a new page (with the table header) if it does not fit."""
+        cells = [wrap(str(value), width - 2 * CELL_PADDING, FONT_SIZE, bold)
+                 for value, width in zip(values, self.widths)]
+        height = max(len(lines) for lines in cells) * LINE_HEIGHT + CELL_PADDING
+
+        if self.y + height > PAGE_HEIGHT - MARGIN and not bold:
+            self._new_page()
+            self._draw_header()
+
+        x = MARGIN
+        top = PAGE_HEIGHT - self.y - height
+        for lines, width, align in zip(cells, self.widths, self.align):
+            if fill:
+                self.content.write(b'0.9 g %.2f %.2f %.2f %.2f re f 0 g\n' % (x, top, width, height))
+            self.content.write(b'%.2f %.2f %.2f %.2f re S\n' % (x, top, width, height))
+            for i, line in enumerate(lines):
+                if align == 'C':
+                    text_x = x + (width - text_width(line, FONT_SIZE, bold)) / 2
+                else:
+                    text_x = x + CELL_PADDING
+                self._text(line, text_x, self.y + (i + 1) * LINE_HEIGHT - CELL_PADDING / 2, FONT_SIZE, bold)
+            x += width
+        self.y += height
+
+    def _draw_header(self):
+        self._draw_row(self.headers, bold=True, fill=True)
+
+    def add_row(self, values):
+        self._draw_row(values)
+
+    def close(self):
+        """Write the last page, the page tree and the cross-reference table."""
+        self._finish_page()
+        kids = b' '.join(b'%d 0 R' % page_id for page_id in self.page_ids)
+        self._write_object(2, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(self.page_ids)))
+        self._write_object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+
+        xref_position = self.position
+        size = self.next_id
+        entries = [b'0000000000 65535 f \n']
+        for obj_id in range(1, size):
+            if obj_id in self.offsets:
+                entries.append(b'%010d 00000 n \n' % self.offsets[obj_id])
+            else:
+                entries.append(b'0000000000 65535 f \n')  # Logo id left unused
+        self._write(b'xref\n0 %d\n' % size + b''.join(entries))
+        self._write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (size, xref_position))
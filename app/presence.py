@@ -0,0 +1,186 @@
+"""
+Who is connected to the chat, shared by every worker process.
+
+Each Socket.IO connection is a session (sid, user id). PRESENCE_BACKEND
+selects where sessions are kept: 'memory' (this process only, enough for a
+single worker) or 'database' (the presence_session table, seen by every
+worker). A heartbeat task refreshes the sessions held by this process every
+PRESENCE_TTL / 3 seconds; sessions not refreshed for PRESENCE_TTL seconds,
+left behind by a worker that crashed or was killed, are purged and their
+users reported offline.
+
+A user can hold several connections (tabs, devices). Every connection joins
+the user's room, so events sent to user_room() reach all of them, and the
+user only goes offline when the last one closes.
+"""
+import os
+import socket
+from datetime import datetime, timedelta
+from threading import Lock
+from flask import current_app
+from sqlalchemy import delete, func, insert, select, update
+from app import db, socketio
+from app.models import PresenceSession
+from app.user_roster import get_user
+
+def worker_id():
+    # Read on every call: with a preloading server the module is imported before the fork
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+def user_room(user_id):
+    """Socket.IO room joined by every connection of a user."""
+    return f'user:{user_id}'
+
+class MemoryPresence:
+    """Sessions of this process only."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._sessions = {}  # {sid: [user_id, last_seen]}
+        self._by_user = {}   # {user_id: set of sids}
+
+    def add(self, sid, user_id):
+        """Record a session. Returns how many sessions the user has now."""
+        with self._lock:
+            self._sessions[sid] = [user_id, datetime.utcnow()]
+            sids = self._by_user.setdefault(user_id, set())
+            sids.add(sid)
+            return len(sids)
+
+    def remove(self, sid):
+        """
+        Forget a session. Returns (user id, sessions the user has left), or
+        (None, 0) if the session was unknown.
+        """
+        with self._lock:
+            session = self._sessions.pop(sid, None)
+            if not session:
+                return None, 0
+            return session[0], self._discard(session[0], sid)
+
+    def _discard(self, user_id, sid):
+        sids = self._by_user.get(user_id, set())
+        sids.discard(sid)
+        if not sids:
+            self._by_user.pop(user_id, None)
+        return len(sids)
+
+    def is_online(self, user_id):
+        with self._lock:
+            return user_id in self._by_user
+
+    def online_ids(self):
+        with self._lock:
+            return set(self._by_user)
+
+    def heartbeat(self):
+        now = datetime.utcnow()
+        with self._lock:
+            for session in self._sessions.values():
+                session[1] = now
+
+    def purge(self, ttl):
+        """Drop sessions older than ttl seconds. Returns the users left with no session."""
+        cutoff = datetime.utcnow() - timedelta(seconds=ttl)
+        offline = set()
+        with self._lock:
+            stale = [sid for sid, (_, last_seen) in self._sessions.items() if last_seen < cutoff]
+            for sid in stale:
+                user_id = self._sessions.pop(sid)[0]
+                if self._discard(user_id, sid) == 0:
+                    offline.add(user_id)
+        return offline
+
+class DatabasePresence:
+    """Sessions of every worker, in the presence_session table."""
+
+    # Sessions are counted so that concurrent connects or disconnects of one user
+    # report the change more than once rather than never: a connect counts inside
+    # its transaction (other new sessions not visible yet), a disconnect after commit
+    def add(self, sid, user_id):
+        now = datetime.utcnow()
+        with db.engine.begin() as conn:
+            conn.execute(delete(PresenceSession).where(PresenceSession.sid == sid))
+            conn.execute(insert(PresenceSession).values(
+                sid=sid, user_id=user_id, worker=worker_id(), connected_at=now, last_seen=now))
+            return self._count(conn, user_id)
+
+    def remove(self, sid):
+        with db.engine.begin() as conn:
+            user_id = conn.execute(
+                select(PresenceSession.user_id).where(PresenceSession.sid == sid)).scalar()
+            if user_id is None:
+                return None, 0
+            conn.execute(delete(PresenceSession).where(PresenceSession.sid == sid))
+        with db.engine.connect() as conn:
+            return user_id, self._count(conn, user_id)
+
+    @staticmethod
+    def _count(conn, user_id):
+        return conn.execute(select(func.count()).select_from(PresenceSession)
+                            .where(PresenceSession.user_id == user_id)).scalar()
+
+    def is_online(self, user_id):
+        with db.engine.connect() as conn:
+            return self._count(conn, user_id) > 0
+
+    def online_ids(self):
+        with db.engine.connect() as conn:
+            return set(conn.execute(select(PresenceSession.user_id).distinct()).scalars())
+
+    def heartbeat(self):
+        with db.engine.begin() as conn:
+            conn.execute(update(PresenceSession).where(PresenceSession.worker == worker_id())
+                         .values(last_seen=datetime.utcnow()))
+
+    def purge(self, ttl):
+        cutoff = datetime.utcnow() - timedelta(seconds=ttl)
+        with db.engine.begin() as conn:
+            users = set(conn.execute(
+                select(PresenceSession.user_id).where(PresenceSession.last_seen < cutoff)).scalars())
+            if not users:
+                return set()
+            conn.execute(delete(PresenceSession).where(PresenceSession.last_seen < cutoff))
+            online = set(conn.execute(
+                select(PresenceSession.user_id).where(PresenceSession.user_id.in_(users))).scalars())
+        return users - online
+
+BACKENDS = {'memory': MemoryPresence, 'database': DatabasePresence}
+
+_lock = Lock()
+_store = None
+_heartbeat_started = False
+
+def get_presence():
+    """Return the presence store of this process, starting its heartbeat task."""
+    global _store, _heartbeat_started
+    with _lock:
+        if _store is None:
+            _store = BACKENDS[current_app.config['PRESENCE_BACKEND']]()
+        if not _heartbeat_started:
+            _heartbeat_started = True
+            socketio.start_background_task(_heartbeat, current_app._get_current_object())
+        return _store
+
+def emit_status_change(user_id, username, is_online):
+    """Broadcast a user going online or offline to every client, on every worker."""
+    socketio.emit('user_status_changed', {
+        'user_id': user_id,
+        'username': username,
+        'is_online': is_online,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    })
+
+def _heartbeat(app):
+    """Background task: keep this process's sessions alive and purge the stale ones."""
+    ttl = app.config['PRESENCE_TTL']
+    while True:
+        socketio.sleep(ttl / 3)
+        with app.app_context():
+            try:
+                _store.heartbeat()
+                for user_id in _store.purge(ttl):
+                    user = get_user(user_id)
+                    emit_status_change(user_id, user.username if user else None, False)
+            except Exception as e:
+                print(f'Error refreshing chat presence: {e!r}')
@@ -0,0 +1,159 @@
+"""
+Versioned cache of generated reports.
+
+Any transaction that writes tickets (or renames, adds or deletes users)
+bumps the 'export' DataVersion right after it commits. Report files are
+named after their format, role scope and the version they were generated
+from, so a file stays valid until the next write and is then simply never looked up again.
+Older versions are deleted when a newer one is stored, a stale one is never
+stored over a newer one, and the folder is kept under REPORT_CACHE_MAX_MB
+and REPORT_RETENTION.
+"""
+import os
+import time
+from sqlalchemy import event, insert, select, update, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app import db
+from app.models import DataVersion, Ticket, User
+
+EXPORT_VERSION = 'export'
+
+def current_version():
+    """Return the current version of the exported data."""
+    value = db.session.execute(
+        select(DataVersion.value).where(DataVersion.name == EXPORT_VERSION)).scalar()
+    return value or 0
+
+def artifact_name(report_format, scope, scope_id, version):
+    return f'{report_format}-{scope}-{scope_id}-v{version}.{report_format}'
+
+def lookup(folder, name):
+    """
+    Return the path of a cached report, or None. Marks it as recently used
+    through its access time; the modification time stays the generation time.
+    """
+    path = os.path.join(folder, name)
+    try:
+        os.utime(path, (time.time(), os.stat(path).st_mtime))
+    except OSError:
+        return None
+    return path
+
+def _split_version(name):
+    """Return (prefix, version) of a report file name, or (None, None) if it is not one."""
+    prefix, sep, rest = name.rpartition('-v')
+    version = rest.split('.', 1)[0]
+    if not sep or not version.isdigit() or name.endswith('.part'):
+        return None, None
+    return prefix + '-v', int(version)
+
+def store(folder, name, tmp_path, max_bytes, max_age):
+    """
+    Move a generated report into the cache and evict what is no longer
+    needed. Returns the path of the newest cached version of the report: if
+    a job for a newer version finished first, the stale file is dropped and
+    the newer one is returned instead.
+    """
+    prefix, version = _split_version(name)
+    others = []
+    for other in os.listdir(folder):
+        other_prefix, other_version = _split_version(other)
+        if other_prefix == prefix and other != name:
+            others.append((other_version, other))
+
+    newest = max(others, default=None)
+    if newest and newest[0] > version:
+        os.remove(tmp_path)
+        return os.path.join(folder, newest[1])
+
+    path = os.path.join(folder, name)
+    os.replace(tmp_path, path)
+
+    # Older versions of the same report can never be served again
+    for _, other in others:
+        try:
+            os.remove(os.path.join(folder, other))
+        except OSError:
+            pass
+
+    evict(folder, max_bytes, max_age)
+    return path
+
+def evict(folder, max_bytes, max_age):
+    """
+    Delete files older than max_age seconds, then the least recently used
+    reports until the folder holds at most max_bytes.
+    """
+    now = time.time()
+    files = []
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        if now - stat.st_mtime > max_age:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        elif not name.endswith(('.json', '.part', '.progress', '.tmp')):
+            files.append((stat.st_atime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+def _changes_exports(session):
+    """True if a flush writes data that appears in the reports."""
+    for obj in session.new | session.deleted:
+        if isinstance(obj, (Ticket, User)):
+            return True
+    for obj in session.dirty:
+        if isinstance(obj, Ticket) and session.is_modified(obj):
+            return True
+        # Users only appear in reports by username
+        if isinstance(obj, User) and inspect(obj).attrs.username.history.has_changes():
+            return True
+    return False
+
+@event.listens_for(Session, 'after_flush')
+def _flag_version(session, flush_context):
+    if _changes_exports(session):
+        session.info['export_changed'] = True
+
+@event.listens_for(Session, 'after_rollback')
+def _clear_version(session):
+    # A savepoint rollback keeps what the outer transaction flushed before it
+    if not session.in_nested_transaction():
+        session.info.pop('export_changed', None)
+
+@event.listens_for(Session, 'after_commit')
+def _bump_version(session):
+    # Bumped after commit in its own short transaction, so writers do not
+    # hold the single version row locked until they commit
+    if session.in_nested_transaction():
+        return  # A savepoint: the outer transaction is still open
+    if not session.info.pop('export_changed', False):
+        return
+    bump = update(DataVersion).where(DataVersion.name == EXPORT_VERSION).values(value=DataVersion.value + 1)
+    try:
+        with db.engine.begin() as conn:
+            if conn.execute(bump).rowcount:
+                return
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(insert(DataVersion).values(name=EXPORT_VERSION, value=1))
+        except IntegrityError:
+            # Another transaction created the row first
+            with db.engine.begin() as conn:
+                conn.execute(bump)
+    except Exception as e:
+        print(f'Error bumping the export data version: {e!r}')
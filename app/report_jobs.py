@@ -0,0 +1,228 @@
+"""
+Background report jobs.
+
+Exports (from the dashboard, or the /export routes when the report is not
+cached) run in a process pool instead of the request, so a large report never blocks the server (and every Socket.IO
+client on it). Each job writes its artifact to REPORTS_FOLDER; progress and
+completion are pushed to the dashboard room of the requester's scope. A
+request for a report that is already being generated for the same format,
+scope and data version joins the running job instead of starting another
+one, and one that is already in the cache (app.report_cache) is ready at once.
+
+Job metadata is kept next to the artifact as JSON, so any worker process can
+serve the download.
+"""
+import json
+import os
+import pickle
+import re
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from threading import Lock
+from flask import current_app
+from app import db, socketio
+from app.models import User
+from app.ticket_export import FORMATS
+from app.ticket_stats import scope_for_user, get_stats, dashboard_room
+from app import report_cache
+
+STATUS_PENDING = 'pendiente'
+STATUS_RUNNING = 'en_proceso'
+STATUS_DONE = 'listo'
+STATUS_FAILED = 'error'
+
+PROGRESS_INTERVAL = 1.0  # Seconds between progress updates
+JOB_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+_lock = Lock()
+_executor = None
+_active = {}  # {artifact name: job_id} of jobs not finished yet
+
+def _meta_path(folder, job_id):
+    return os.path.join(folder, f'{job_id}.json')
+
+def _progress_path(folder, job_id):
+    return os.path.join(folder, f'{job_id}.progress')
+
+def artifact_path(folder, job):
+    return os.path.join(folder, job['artifact'])
+
+def _part_path(folder, job):
+    return os.path.join(folder, f"{job['id']}.part")
+
+def _write_json(path, data):
+    """Write a file atomically, so readers never see it half written."""
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+def get_job(job_id):
+    """Return the metadata of a job, or None."""
+    if not JOB_ID_RE.match(job_id or ''):
+        return None
+    try:
+        with open(_meta_path(current_app.config['REPORTS_FOLDER'], job_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def can_access(job, user):
+    """Jobs are shared by every user with the same report scope."""
+    scope, scope_id = scope_for_user(user)
+    return job['scope'] == scope and job['scope_id'] == scope_id
+
+def public(job):
+    """Fields of a job sent to the browser."""
+    return {key: job[key] for key in ('id', 'format', 'status', 'done', 'total')}
+
+# Worker processes: each one builds its own app (and database engine) once
+_worker_app = None
+
+def _init_worker(config):
+    global _worker_app
+    from app import create_app
+    _worker_app = create_app(type('ReportConfig', (), config))
+
+def _run_job(job, folder):
+    """Generate a report inside a worker process."""
+    with _worker_app.app_context():
+        user = db.session.get(User, job['user_id'])
+        writer = FORMATS[job['format']][0]
+        last_update = 0
+
+        def progress(done):
+            nonlocal last_update
+            now = time.monotonic()
+            if now - last_update >= PROGRESS_INTERVAL:
+                last_update = now
+                _write_json(_progress_path(folder, job['id']), done)
+
+        with open(_part_path(folder, job), 'wb') as output:
+            writer(user, output, progress)
+
+def _worker_config(app):
+    """The app config values that can be sent to a worker process."""
+    config = {}
+    for key, value in app.config.items():
+        if not key.isupper():
+            continue
+        try:
+            pickle.dumps(value)
+        except Exception:
+            continue
+        config[key] = value
+    return config
+
+def _get_executor(app):
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=app.config['REPORT_WORKERS'],
+            initializer=_init_worker,
+            initargs=(_worker_config(app),),
+        )
+    return _executor
+
+def _emit(job, event):
+    socketio.emit(event, public(job), to=dashboard_room(job['scope'], job['scope_id']))
+
+def _watch(app, job, future):
+    """Background task: relay a job's progress until it finishes."""
+    global _executor
+    folder = app.config['REPORTS_FOLDER']
+    while not future.done():
+        socketio.sleep(PROGRESS_INTERVAL)
+        try:
+            with open(_progress_path(folder, job['id'])) as f:
+                done = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if done != job['done']:
+            job.update(status=STATUS_RUNNING, done=done)
+            _write_json(_meta_path(folder, job['id']), job)
+            _emit(job, 'report_progress')
+
+    name = job['artifact']
+    try:
+        future.result()
+        path = report_cache.store(folder, job['artifact'], _part_path(folder, job),
+                                  app.config['REPORT_CACHE_MAX_MB'] * 1024 * 1024, app.config['REPORT_RETENTION'])
+        # A job for newer data may have finished first; its report is served instead
+        job.update(status=STATUS_DONE, done=job['total'], artifact=os.path.basename(path))
+        event = 'report_ready'
+    except Exception as e:
+        print(f"Error generating report {job['id']}: {e!r}")
+        if isinstance(e, BrokenProcessPool):
+            with _lock:
+                _executor = None
+        job.update(status=STATUS_FAILED)
+        event = 'report_failed'
+
+    with _lock:
+        _write_json(_meta_path(folder, job['id']), job)
+        _active.pop(name, None)
+    for path in (_progress_path(folder, job['id']), _part_path(folder, job)):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    _emit(job, event)
+
+def _artifact_for(report_format, user):
+    """Return (scope, scope_id, artifact name) of a user's report at the current data version."""
+    scope, scope_id = scope_for_user(user)
+    version = report_cache.current_version()
+    return scope, scope_id, report_cache.artifact_name(report_format, scope, scope_id, version)
+
+def cached_report(report_format, user):
+    """Return the path of the user's report if it is cached at the current version, or None."""
+    _, _, name = _artifact_for(report_format, user)
+    return report_cache.lookup(current_app.config['REPORTS_FOLDER'], name)
+
+def enqueue(report_format, user):
+    """
+    Start generating a report for a user, or return the job already
+    generating the same report for the user's scope.
+    """
+    app = current_app._get_current_object()
+    folder = app.config['REPORTS_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+
+    scope, scope_id, name = _artifact_for(report_format, user)
+
+    with _lock:
+        job_id = _active.get(name)
+        if job_id:
+            job = get_job(job_id)
+            if job:
+                return job
+
+        report_cache.evict(folder, app.config['REPORT_CACHE_MAX_MB'] * 1024 * 1024, app.config['REPORT_RETENTION'])
+        job = {
+            'id': uuid.uuid4().hex,
+            'format': report_format,
+            'scope': scope,
+            'scope_id': scope_id,
+            'user_id': user.id,
+            'artifact': name,
+            'status': STATUS_PENDING,
+            'done': 0,
+            # Precomputed counters give the row count for the progress bar
+            'total': get_stats(scope, scope_id)['total'],
+            'created_at': datetime.utcnow().isoformat(),
+        }
+        if report_cache.lookup(folder, name):
+            job.update(status=STATUS_DONE, done=job['total'])
+            _write_json(_meta_path(folder, job['id']), job)
+            return job
+
+        _write_json(_meta_path(folder, job['id']), job)
+        future = _get_executor(app).submit(_run_job, job, folder)
+        _active[name] = job['id']
+
+    socketio.start_background_task(_watch, app, dict(job), future)
+    return job
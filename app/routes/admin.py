@@ -4,6 +4,7 @@ from app import db
 from app.models import User
 from app.utils import admin_required
 from app.utils.alerts import success, error, warning
+from app.user_roster import invalidate as invalidate_roster
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -43,6 +44,7 @@ def create_user():
         user.set_password(password)
         db.session.add(user)
         db.session.commit()
+        invalidate_roster()
         success('Usuario creado exitosamente.')
         return redirect(url_for('admin.users'))
         
@@ -69,6 +71,7 @@ def edit_user(id):
         
         try:
             db.session.commit()
+            invalidate_roster()
             success('Usuario actualizado exitosamente.')
             return redirect(url_for('admin.users'))
         except:
@@ -87,6 +90,7 @@ def delete_user(id):
         
     db.session.delete(user)
     db.session.commit()
+    invalidate_roster()
     success('Usuario eliminado exitosamente.')
     return redirect(url_for('admin.users'))
 
@@ -133,6 +137,13 @@ def audit_logs():
                          action_filter=action_filter,
                          days_filter=days_filter)
 
+@bp.route('/email-stats')
+@admin_required
+def email_stats():
+    """Email outbox depth and send rate"""
+    from app.email_outbox import stats
+    return stats()
+
 @bp.route('/settings', methods=['GET', 'POST'])
 @admin_required
 def settings():
@@ -1,24 +1,29 @@
-from flask import request
+from flask import current_app, request
 from flask_socketio import emit, join_room, leave_room
 from flask_login import current_user
 from app import socketio, db
-from app.models import ChatMessage, User
-
-# Dictionary to track online users: {user_id: session_id}
-online_users = {}
+from app.ticket_stats import dashboard_room, scope_for_user
+from app.user_roster import get_roster, get_user
+from app.presence import get_presence, emit_status_change, user_room
+from app import conversations, chat_writer, chat_digest, chat_archive
 
 @socketio.on('connect')
 def handle_connect():
     if current_user.is_authenticated:
-        # Add user to online users
-        online_users[current_user.id] = request.sid
+        # Every tab or device of the user joins the user's room
+        join_room(user_room(current_user.id))
+        sessions = get_presence().add(request.sid, current_user.id)
+        chat_digest.start_task()
         print(f'User {current_user.username} connected with sid {request.sid}')
         
-        # Broadcast updated online users list to all clients
-        emit_online_users()
+        # Receive dashboard stats pushes for the user's scope
+        join_room(dashboard_room(*scope_for_user(current_user)))
         
-        # Broadcast individual status change to all other clients
-        emit_user_status_change(current_user.id, current_user.username, True)
+        # Only this client gets the full list; everyone else gets a small delta,
+        # and only when the user's first connection opens
+        emit_online_users()
+        if sessions == 1:
+            emit_status_change(current_user.id, current_user.username, True)
         
         # Send unread counts to current user
         unread_counts = get_unread_counts(current_user.id)
@@ -32,16 +37,13 @@ def handle_disconnect():
         user_id = current_user.id
         username = current_user.username
         
-        # Remove user from online users
-        if user_id in online_users:
-            del online_users[user_id]
+        # The user stays online while another tab or device is connected
+        removed_id, sessions = get_presence().remove(request.sid)
+        if removed_id is not None:
             print(f'User {username} disconnected')
             
-            # Broadcast updated online users list
-            emit_online_users()
-            
-            # Broadcast individual status change to all other clients
-            emit_user_status_change(user_id, username, False)
+            if sessions == 0:
+                emit_status_change(user_id, username, False)
 
 @socketio.on('get_online_users')
 def handle_get_online_users():
@@ -57,80 +59,94 @@ def handle_private_message(data):
     receiver_id = data.get('receiver_id')
     content = data.get('content')
     
-    if not receiver_id or not content:
+    if not isinstance(receiver_id, int) or not content:
         return
     
-    # Save message to database
-    message = ChatMessage(
-        sender_id=current_user.id,
-        receiver_id=receiver_id,
-        content=content
-    )
-    db.session.add(message)
-    db.session.commit()
+    # Save message to database (or to the write buffer, see app/chat_writer.py)
+    message_id, timestamp = chat_writer.save_message(current_user.id, receiver_id, content)
     
     # Prepare message data
     message_data = {
-        'id': message.id,
+        'id': message_id,
         'sender_id': current_user.id,
         'sender_name': current_user.username,
         'receiver_id': receiver_id,
         'content': content,
-        'timestamp': message.timestamp.strftime('%Y-%m-%d %H:%M:%S')
+        'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S')
     }
     
-    # Send to sender (confirmation)
-    emit('new_message', message_data, room=request.sid)
+    # Send to all of the sender's tabs (confirmation)
+    emit('new_message', message_data, room=user_room(current_user.id))
     
-    # Send to receiver if online, otherwise send email
-    if receiver_id in online_users:
-        receiver_sid = online_users[receiver_id]
-        emit('new_message', message_data, room=receiver_sid)
-    else:
-        # Receiver is offline, send email notification
-        receiver = User.query.get(receiver_id)
-        if receiver:
-            from app.email import send_chat_notification_email
-            # Truncate message for preview
-            message_preview = content[:100] + '...' if len(content) > 100 else content
-            send_chat_notification_email(current_user, receiver, message_preview)
+    # Send to every connection of the receiver, on any worker, or email if there is none
+    if get_presence().is_online(receiver_id):
+        emit('new_message', message_data, room=user_room(receiver_id))
+    elif get_user(receiver_id):
+        # Receiver is offline: collect it for a single email digest (see app/chat_digest.py)
+        chat_digest.queue_message(receiver_id, message_id)
+
+@socketio.on('get_conversations')
+def handle_get_conversations():
+    """Send the current user's conversations, most recent first"""
+    if not current_user.is_authenticated:
+        return
+    
+    recent = conversations.recent_conversations(current_user.id)
+    for conversation in recent:
+        user = get_user(conversation['user_id'])
+        conversation['username'] = user.username if user else ''
+    emit('conversations', {'conversations': recent})
 
 @socketio.on('get_chat_history')
 def handle_get_chat_history(data):
-    """Get chat history between current user and another user"""
+    """
+    Send a page of the chat history between current user and another user:
+    the latest CHAT_HISTORY_PAGE_SIZE messages, or those older than before_id
+    when loading older ones.
+    """
     if not current_user.is_authenticated:
         return
     
     other_user_id = data.get('user_id')
-    if not other_user_id:
+    if not isinstance(other_user_id, int):
+        return
+    before_id = data.get('before_id')
+    if before_id is not None and not isinstance(before_id, int):
         return
+    page_size = current_app.config['CHAT_HISTORY_PAGE_SIZE']
+    chat_writer.sync()
     
-    # Get messages between these two users
-    messages = ChatMessage.query.filter(
-        db.or_(
-            db.and_(ChatMessage.sender_id == current_user.id, ChatMessage.receiver_id == other_user_id),
-            db.and_(ChatMessage.sender_id == other_user_id, ChatMessage.receiver_id == current_user.id)
-        )
-    ).order_by(ChatMessage.timestamp.asc()).all()
+    # Opening the conversation marks what the other user sent as read, in one statement
+    if before_id is None:
+        conversations.mark_read(current_user.id, other_user_id)
+        db.session.commit()
+        chat_digest.cancel_if_read(current_user.id)
     
-    # Mark messages as read
-    for msg in messages:
-        if msg.receiver_id == current_user.id and not msg.read:
-            msg.read = True
-    db.session.commit()
+    # Falls through to the archive once the user scrolls back past the live messages
+    messages = chat_archive.history_page(current_user.id, other_user_id, before_id, page_size + 1)
+    has_more = len(messages) > page_size
+    messages = messages[:page_size][::-1]
     
     # Format messages
-    history = [{
-        'id': msg.id,
-        'sender_id': msg.sender_id,
-        'sender_name': msg.sender.username,
-        'receiver_id': msg.receiver_id,
-        'content': msg.content,
-        'timestamp': msg.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-        'read': msg.read
-    } for msg in messages]
+    history = []
+    for msg in messages:
+        sender = get_user(msg.sender_id)
+        history.append({
+            'id': msg.id,
+            'sender_id': msg.sender_id,
+            'sender_name': sender.username if sender else '',
+            'receiver_id': msg.receiver_id,
+            'content': msg.content,
+            'timestamp': msg.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            'read': msg.read
+        })
     
-    emit('chat_history', {'messages': history, 'other_user_id': other_user_id})
+    emit('chat_history', {
+        'messages': history,
+        'other_user_id': other_user_id,
+        'before_id': before_id,
+        'has_more': has_more,
+    })
 
 @socketio.on('mark_as_read')
 def handle_mark_as_read(data):
@@ -139,59 +155,40 @@ def handle_mark_as_read(data):
         return
     
     sender_id = data.get('sender_id')
-    if not sender_id:
+    if not isinstance(sender_id, int):
         return
     
     # Mark all unread messages from this sender as read
-    ChatMessage.query.filter_by(
-        sender_id=sender_id,
-        receiver_id=current_user.id,
-        read=False
-    ).update({'read': True})
+    chat_writer.sync()
+    conversations.mark_read(current_user.id, sender_id)
     db.session.commit()
+    chat_digest.cancel_if_read(current_user.id)
 
-def emit_online_users():
-    """Broadcast list of ALL users (online and offline) to all connected clients"""
-    # Get ALL users
-    all_users = User.query.all()
-    
-    # Create a list for each connected user
-    for user_id, session_id in online_users.items():
-        user_list = []
-        for user in all_users:
-            # Don't include the user themselves in their own list
-            if user.id != user_id:
-                user_list.append({
-                    'id': user.id,
-                    'username': user.username,
-                    'role': user.role,
-                    'profile_picture': user.get_profile_picture(),
-                    'is_online': user.id in online_users  # Mark if user is online
-                })
-        
-        # Sort: online users first, then by username
-        user_list.sort(key=lambda x: (not x['is_online'], x['username']))
-        
-        # Send to this specific user
-        emit('online_users', {'users': user_list}, room=session_id)
+# Serialized roster, rebuilt only when the cached roster is reloaded
+_roster_payload = None
+_roster_payload_source = None
 
-def emit_user_status_change(user_id, username, is_online):
-    """Broadcast individual user status change to all connected clients"""
-    from datetime import datetime
-    emit('user_status_changed', {
-        'user_id': user_id,
-        'username': username,
-        'is_online': is_online,
-        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    }, broadcast=True)
+def roster_payload():
+    """Return the roster as a list of dicts, shared by every client."""
+    global _roster_payload, _roster_payload_source
+    roster = get_roster()
+    if roster is not _roster_payload_source:
+        _roster_payload = [{
+            'id': user.id,
+            'username': user.username,
+            'role': user.role,
+            'profile_picture': user.profile_picture,
+        } for user in roster.values()]
+        _roster_payload_source = roster
+    return _roster_payload
+
+def emit_online_users():
+    """
+    Send the requesting client every user plus the ids of those online. The
+    client keeps this list and applies user_status_changed deltas to it.
+    """
+    emit('online_users', {'users': roster_payload(), 'online_ids': list(get_presence().online_ids())})
 
 def get_unread_counts(user_id):
     """Get count of unread messages for a user from each sender"""
-    unread_counts = db.session.query(
-        ChatMessage.sender_id, db.func.count(ChatMessage.id)
-    ).filter(
-        ChatMessage.receiver_id == user_id,
-        ChatMessage.read == False
-    ).group_by(ChatMessage.sender_id).all()
-    
-    return {sender_id: count for sender_id, count in unread_counts}
+    return conversations.unread_counts(user_id)
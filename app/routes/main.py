@@ -1,93 +1,80 @@
-from flask import Blueprint, render_template, request, redirect, url_for, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, send_file, Response, stream_with_context, abort, current_app
 from flask_login import login_required, current_user
-from app import db
-from app.models import Ticket, User
+from app import db, limiter
+from sqlalchemy.orm import joinedload
+from app.models import Ticket, User, Comment
 from app.utils import tech_required
 from app.utils.alerts import success, error, warning
-import pandas as pd  # Commented temporarily - install pandas later for Excel/CSV export
-from fpdf import FPDF
-import io
-from datetime import datetime
+from app.utils.pagination import keyset_paginate, get_page_size, PAGE_SIZES
+from app.user_roster import get_roster, get_technicians, invalidate as invalidate_roster
+from app.ticket_search import search_tickets, TICKET_NUMBER_RE, SEARCH_PAGE_SIZE
+from app.suggest_index import suggest as get_suggestions
+from app.ticket_stats import get_stats_for_user, record_change, snapshot, publish_changes, scope_for_user, SCOPE_GLOBAL
+from app.ticket_rollups import record_change as record_rollup_change, get_trends, DIMENSIONS, MAX_RANGE_DAYS
+from app.ticket_export import csv_chunks, columnar_available, FORMATS, COLUMNAR_FORMATS, SINCE_OVERLAP
+from app import report_jobs
+import os
+import tempfile
+from datetime import datetime, date, timedelta, timezone
 
 bp = Blueprint('main', __name__)
 
+# Comments shown on the ticket page; older ones are loaded on demand
+COMMENTS_PAGE_SIZE = 20
+
 @bp.route('/')
 @login_required
 def index():
-    # Base query
-    query = Ticket.query
-    
-    # Filter based on role
-    if current_user.role == 'tecnico':
-        query = query.filter_by(assigned_to_id=current_user.id)
-    elif current_user.role == 'usuario':
-        query = query.filter_by(created_by_id=current_user.id)
-        
-    # Calculate stats
-    total_tickets = query.count()
-    open_tickets = query.filter_by(status='abierto').count()
-    in_progress = query.filter_by(status='en_proceso').count()
-    closed_tickets = query.filter_by(status='cerrado').count()
-    
-    # Data for charts
-    status_data = [open_tickets, in_progress, closed_tickets]
-    
-    # Priority Data (re-apply filters for these counts)
-    # Note: We can't reuse the 'query' object easily for different filters if it's already filtered by status above
-    # So we rebuild the base filter
-    base_query = Ticket.query
-    if current_user.role == 'tecnico':
-        base_query = base_query.filter_by(assigned_to_id=current_user.id)
-    elif current_user.role == 'usuario':
-        base_query = base_query.filter_by(created_by_id=current_user.id)
-
-    high_priority = base_query.filter_by(priority='alta').count()
-    medium_priority = base_query.filter_by(priority='media').count()
-    low_priority = base_query.filter_by(priority='baja').count()
-    priority_data = [high_priority, medium_priority, low_priority]
+    # Stats come from the precomputed counters of the user's scope
+    stats = get_stats_for_user(current_user)
     
     return render_template('dashboard.html', 
-                         total=total_tickets, 
-                         open=open_tickets, 
-                         process=in_progress, 
-                         closed=closed_tickets,
-                         status_data=status_data,
-                         priority_data=priority_data)
+                         total=stats['total'], 
+                         open=stats['open'], 
+                         process=stats['process'], 
+                         closed=stats['closed'],
+                         status_data=stats['status_data'],
+                         priority_data=stats['priority_data'])
 
 @bp.route('/api/dashboard-stats')
 @login_required
 def dashboard_stats():
-    # Re-calculate stats (logic duplicated for now, could be refactored)
-    query = Ticket.query
-    if current_user.role == 'tecnico':
-        query = query.filter_by(assigned_to_id=current_user.id)
-    elif current_user.role == 'usuario':
-        query = query.filter_by(created_by_id=current_user.id)
-        
-    total = query.count()
-    open_t = query.filter_by(status='abierto').count()
-    process = query.filter_by(status='en_proceso').count()
-    closed = query.filter_by(status='cerrado').count()
+    return get_stats_for_user(current_user)
+
+@bp.route('/api/trends')
+@login_required
+@tech_required
+def trends():
+    # Date range, defaults to the last 30 days
+    try:
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else datetime.utcnow().date()
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else end - timedelta(days=29)
+    except ValueError:
+        return {'error': 'Formato de fecha inválido, use YYYY-MM-DD'}, 400
     
-    # Priority
-    base_query = Ticket.query
+    if start > end or (end - start).days >= MAX_RANGE_DAYS:
+        return {'error': f'El rango debe ser de 1 a {MAX_RANGE_DAYS} días'}, 400
+    
+    dimension = request.args.get('dimension', 'all')
+    if dimension not in DIMENSIONS:
+        return {'error': f'Dimensión inválida, use: {", ".join(DIMENSIONS)}'}, 400
+    
+    # Technicians only see their own assignments
+    bucket = None
     if current_user.role == 'tecnico':
-        base_query = base_query.filter_by(assigned_to_id=current_user.id)
-    elif current_user.role == 'usuario':
-        base_query = base_query.filter_by(created_by_id=current_user.id)
-
-    high = base_query.filter_by(priority='alta').count()
-    medium = base_query.filter_by(priority='media').count()
-    low = base_query.filter_by(priority='baja').count()
+        dimension, bucket = 'assignee', str(current_user.id)
     
-    return {
-        'total': total,
-        'open': open_t,
-        'process': process,
-        'closed': closed,
-        'status_data': [open_t, process, closed],
-        'priority_data': [high, medium, low]
-    }
+    return get_trends(start, end, dimension, bucket)
+
+def _ticket_list_page(query):
+    """Keyset-paginate a ticket query with creator/assignee loaded in the same SELECT"""
+    query = query.options(joinedload(Ticket.created_by), joinedload(Ticket.assigned_to))
+    return keyset_paginate(
+        query, Ticket.created_at, Ticket.id,
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        per_page=get_page_size(request.args.get('per_page'))
+    )
 
 @bp.route('/tickets')
 @login_required
@@ -96,18 +83,20 @@ def tickets():
         return redirect(url_for('main.my_tickets'))
     
     status_filter = request.args.get('status')
+    query = Ticket.query
     if status_filter:
-        tickets = Ticket.query.filter_by(status=status_filter).all()
-    else:
-        tickets = Ticket.query.all()
+        query = query.filter_by(status=status_filter)
+    page = _ticket_list_page(query)
         
-    return render_template('tickets/list.html', tickets=tickets, title='Todos los Tickets')
+    return render_template('tickets/list.html', tickets=page.items, page=page,
+                           page_sizes=PAGE_SIZES, status_filter=status_filter, title='Todos los Tickets')
 
 @bp.route('/my_tickets')
 @login_required
 def my_tickets():
-    tickets = Ticket.query.filter_by(created_by_id=current_user.id).all()
-    return render_template('tickets/list.html', tickets=tickets, title='Mis Tickets')
+    page = _ticket_list_page(Ticket.query.filter_by(created_by_id=current_user.id))
+    return render_template('tickets/list.html', tickets=page.items, page=page,
+                           page_sizes=PAGE_SIZES, status_filter=None, title='Mis Tickets')
 
 @bp.route('/ticket/create', methods=['GET', 'POST'])
 @login_required
@@ -148,11 +137,16 @@ def create_ticket():
             attachment=filename
         )
         db.session.add(ticket)
+        db.session.flush()
+        
+        # Update dashboard counters and daily rollups in the same transaction
+        new_state = snapshot(ticket)
+        changed_scopes = record_change(None, new_state)
+        record_rollup_change(None, new_state)
         db.session.commit()
         
-        # Emit dashboard update
-        from app import socketio
-        socketio.emit('dashboard_update')
+        # Push the new stats to the affected dashboards
+        publish_changes(changed_scopes)
         
         success(f'Ticket {ticket_number} creado exitosamente')
         return redirect(url_for('main.my_tickets'))
@@ -162,8 +156,9 @@ def create_ticket():
 @bp.route('/ticket/<int:id>', methods=['GET', 'POST'])
 @login_required
 def ticket_detail(id):
-    ticket = Ticket.query.get_or_404(id)
-    technicians = User.query.filter_by(role='tecnico').all()
+    ticket = Ticket.query.options(
+        joinedload(Ticket.created_by), joinedload(Ticket.assigned_to)
+    ).filter_by(id=id).first_or_404()
     
     if request.method == 'POST':
         if current_user.role in ['admin', 'tecnico']:
@@ -173,6 +168,7 @@ def ticket_detail(id):
             # Track if assignment changed for email notification
             assignment_changed = False
             newly_assigned_user = None
+            old_state = snapshot(ticket)
             
             if status:
                 ticket.status = status
@@ -184,7 +180,11 @@ def ticket_detail(id):
                 if old_assigned_id != ticket.assigned_to_id and ticket.assigned_to_id:
                     assignment_changed = True
                     newly_assigned_user = User.query.get(ticket.assigned_to_id)
-                
+            
+            # Update dashboard counters and daily rollups in the same transaction
+            new_state = snapshot(ticket)
+            changed_scopes = record_change(old_state, new_state)
+            record_rollup_change(old_state, new_state)
             db.session.commit()
             
             # Send email notification if ticket was assigned
@@ -192,23 +192,42 @@ def ticket_detail(id):
                 from app.email import send_ticket_assigned_email
                 send_ticket_assigned_email(ticket, newly_assigned_user)
             
-            # Emit update event
-            from app import socketio
-            
-            # Emit dashboard update
-            socketio.emit('dashboard_update')
+            # Push the new stats to the affected dashboards
+            publish_changes(changed_scopes)
             
             success('Ticket actualizado')
             return redirect(url_for('main.ticket_detail', id=ticket.id))
-            
-    return render_template('tickets/detail.html', ticket=ticket, technicians=technicians)
+    
+    # Latest comments with their authors, shown oldest first
+    comments = _comments_page(id)
+    return render_template('tickets/detail.html', ticket=ticket, technicians=get_technicians(),
+                           comments=list(reversed(comments.items)), comments_page=comments)
+
+def _comments_page(ticket_id, before=None):
+    """Page of a ticket's comments, newest first, with authors loaded in the same SELECT"""
+    query = Comment.query.options(joinedload(Comment.user)).filter_by(ticket_id=ticket_id)
+    return keyset_paginate(query, Comment.created_at, Comment.id, after=before, per_page=COMMENTS_PAGE_SIZE)
+
+@bp.route('/ticket/<int:id>/comments')
+@login_required
+def ticket_comments(id):
+    """Older comments of a ticket, for the 'load previous comments' button"""
+    page = _comments_page(id, before=request.args.get('before'))
+    return {
+        'comments': [{
+            'id': comment.id,
+            'user': comment.user.username,
+            'content': comment.content,
+            'timestamp': comment.created_at.strftime('%Y-%m-%d %H:%M')
+        } for comment in page.items],
+        'next_cursor': page.next_cursor
+    }
 
 @bp.route('/ticket/<int:id>/comment', methods=['POST'])
 @login_required
 def add_comment(id):
     content = request.form.get('content')
     if content:
-        from app.models import Comment
         from app.security import sanitize_html
         
         # Sanitize HTML content to prevent XSS
@@ -247,200 +266,164 @@ def add_comment(id):
         success('Comentario agregado')
     return redirect(url_for('main.ticket_detail', id=id))
 
+def _send_report(path, report_format):
+    """Send a cached report; the name carries the data version, so it is a stable ETag."""
+    _, download_name, mimetype = FORMATS[report_format]
+    response = send_file(path, download_name=download_name, mimetype=mimetype, as_attachment=True,
+                         etag=os.path.basename(path), conditional=True)
+    if report_format in COLUMNAR_FORMATS:
+        # A full columnar export: the next incremental pull starts from when it was generated
+        generated_at = datetime.utcfromtimestamp(os.path.getmtime(path))
+        response.headers['X-Export-Watermark'] = (generated_at - SINCE_OVERLAP).isoformat()
+        response.headers['X-Export-Mode'] = 'full'
+    return response
+
+def _job_response(job):
+    """202 with a report job and the URLs to follow it and download it when ready."""
+    data = report_jobs.public(job)
+    data['status_url'] = url_for('main.report_status', job_id=job['id'])
+    data['download_url'] = url_for('main.download_report', job_id=job['id'])
+    return data, 202, {'Location': data['status_url']}
+
+def _export(report_format):
+    """
+    Send the user's report if it is cached at the current data version;
+    otherwise start (or join) its background job, so it is never generated
+    inside the request.
+    """
+    path = report_jobs.cached_report(report_format, current_user)
+    if path:
+        return _send_report(path, report_format)
+    job = report_jobs.enqueue(report_format, current_user)
+    if job['status'] == report_jobs.STATUS_DONE:
+        path = report_jobs.artifact_path(current_app.config['REPORTS_FOLDER'], job)
+        if os.path.exists(path):
+            return _send_report(path, report_format)
+    return _job_response(job)
+
 @bp.route('/export/excel')
 @login_required
 def export_excel():
-    # Filter based on role
-    query = Ticket.query
-    if current_user.role == 'tecnico':
-        query = query.filter_by(assigned_to_id=current_user.id)
-    elif current_user.role == 'usuario':
-        query = query.filter_by(created_by_id=current_user.id)
-        
-    tickets = query.all()
-    data = [{
-        'ID': t.id,
-        'Título': t.title,
-        'Estado': t.status,
-        'Prioridad': t.priority,
-        'Creado Por': t.created_by.username,
-        'Asignado A': t.assigned_to.username if t.assigned_to else 'Sin asignar',
-        'Fecha': t.created_at.strftime('%Y-%m-%d %H:%M:%S')
-    } for t in tickets]
-    
-    df = pd.DataFrame(data)
-    output = io.BytesIO()
-    
-    # Use Pandas to write Excel but access the workbook to add filters and logo
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        # Write data starting from row 4 to leave space for logo
-        df.to_excel(writer, index=False, sheet_name='Tickets', startrow=3)
-        worksheet = writer.sheets['Tickets']
-        workbook = writer.book
-        
-        # Add logo image
-        from openpyxl.drawing.image import Image as XLImage
-        import os
-        from flask import current_app
-        logo_path = os.path.join(current_app.root_path, 'static', 'logo.png')
-        if os.path.exists(logo_path):
-            img = XLImage(logo_path)
-            img.height = 50  # Adjust size
-            img.width = 50
-            worksheet.add_image(img, 'A1')
-        
-        # Add title next to logo
-        from openpyxl.styles import Font, Alignment
-        worksheet['B1'] = 'HELP DESK'
-        worksheet['B1'].font = Font(size=20, bold=True)
-        worksheet['B1'].alignment = Alignment(vertical='center')
-        worksheet['B2'] = 'Reporte de Tickets'
-        worksheet['B2'].font = Font(size=14)
-        
-        # Add auto-filter to data columns (starting from row 4)
-        worksheet.auto_filter.ref = f'A4:{worksheet.dimensions.split(":")[1]}'
-        
-        # Adjust column widths
-        for column in worksheet.columns:
-            max_length = 0
-            column = [cell for cell in column]
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(cell.value)
-                except:
-                    pass
-            adjusted_width = (max_length + 2)
-            worksheet.column_dimensions[column[0].column_letter].width = adjusted_width
-
-    output.seek(0)
-    
-    return send_file(output, download_name='reporte_tickets.xlsx', as_attachment=True)
+    return _export('xlsx')
 
 @bp.route('/export/csv')
 @login_required
 def export_csv():
-    # Filter based on role
-    query = Ticket.query
-    if current_user.role == 'tecnico':
-        query = query.filter_by(assigned_to_id=current_user.id)
-    elif current_user.role == 'usuario':
-        query = query.filter_by(created_by_id=current_user.id)
-        
-    tickets = query.all()
-    data = [{
-        'ID': t.id,
-        'Título': t.title,
-        'Estado': t.status,
-        'Prioridad': t.priority,
-        'Creado Por': t.created_by.username,
-        'Asignado A': t.assigned_to.username if t.assigned_to else 'Sin asignar',
-        'Fecha': t.created_at.strftime('%Y-%m-%d %H:%M:%S')
-    } for t in tickets]
-    
-    df = pd.DataFrame(data)
-    output = io.BytesIO()
-    df.to_csv(output, index=False, encoding='utf-8-sig')
-    output.seek(0)
-    
-    return send_file(output, download_name='reporte_tickets.csv', as_attachment=True, mimetype='text/csv')
+    path = report_jobs.cached_report('csv', current_user)
+    if path:
+        return _send_report(path, 'csv')
+    # Stream rows as they are read, one keyset batch in memory at a time
+    return Response(stream_with_context(csv_chunks(current_user)), mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=reporte_tickets.csv'})
 
 @bp.route('/export/pdf')
 @login_required
 def export_pdf():
-    # Filter based on role
-    query = Ticket.query
-    if current_user.role == 'tecnico':
-        query = query.filter_by(assigned_to_id=current_user.id)
-    elif current_user.role == 'usuario':
-        query = query.filter_by(created_by_id=current_user.id)
-        
-    tickets = query.all()
-    
-    pdf = FPDF()
-    pdf.add_page()
-    
-    # Add logo
-    import os
-    from flask import current_app
-    logo_path = os.path.join(current_app.root_path, 'static', 'logo.png')
-    if os.path.exists(logo_path):
-        # Logo on the left
-        pdf.image(logo_path, x=10, y=8, w=20)
-    
-    # Title next to logo
-    pdf.set_font("Arial", 'B', 20)
-    pdf.set_xy(35, 10)
-    pdf.cell(0, 10, txt="HELP DESK", ln=1)
-    pdf.set_font("Arial", 'B', 14)
-    pdf.set_x(35)
-    pdf.cell(0, 5, txt="Reporte de Tickets", ln=1)
-    pdf.ln(10)
-    
-    # Table Header
-    pdf.set_font("Arial", 'B', 10)
-    # Column widths: ID, Title, Status, Priority, CreatedBy, AssignedTo, Date
-    # Total A4 width ~190mm margins included
-    col_widths = [10, 40, 25, 20, 25, 25, 45]
-    headers = ['ID', 'Título', 'Estado', 'Prioridad', 'Creado Por', 'Asignado A', 'Fecha']
-    
-    for i in range(len(headers)):
-        pdf.cell(col_widths[i], 10, headers[i], border=1, align='C')
-    pdf.ln()
-    
-    # Table Body
-    pdf.set_font("Arial", size=10)
-    for t in tickets:
-        assigned = t.assigned_to.username if t.assigned_to else 'Sin asignar'
-        date_str = t.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        
-        data = [str(t.id), t.title, t.status, t.priority, t.created_by.username, assigned, date_str]
-        
-        # Check for max height needed (simple approach, just cut off if too long or let it flow? 
-        # FPDF cell doesn't wrap automatically without MultiCell, but for this simple report Cell is safer for alignment)
-        # We will use Cell and truncate if necessary or just let it be. 
-        # For better table we would need a more complex logic, but this matches the request for "table look".
-        
-        for i in range(len(data)):
-            # Truncate title if too long to avoid messing up table
-            text = str(data[i])
-            if i == 1 and len(text) > 20:
-                text = text[:17] + '...'
-            pdf.cell(col_widths[i], 10, text, border=1, align='C')
-        pdf.ln()
-        
-    output = io.BytesIO(pdf.output(dest='S'))
+    return _export('pdf')
+
+@bp.route('/export/<any(parquet, arrow):report_format>')
+@login_required
+def export_columnar(report_format):
+    """
+    Typed columnar export for analytics. With ?since=<ISO datetime> only the
+    tickets changed since then are sent; the X-Export-Watermark header is the
+    value to pass as since on the next pull (rows are upserted by id). Full
+    exports come from the report cache, or as a background job (202) when
+    the data changed since the last one.
+
+    Incremental pulls only work for the global (admin) scope: tickets are
+    never deleted, but a ticket reassigned away from a technician would
+    never leave their copy. For other scopes since is ignored and the full
+    export is sent; X-Export-Mode says which one ('full' replaces the copy).
+    """
+    if not columnar_available():
+        return {'error': 'La exportación a Parquet/Arrow requiere instalar pyarrow'}, 501
+
+    since = request.args.get('since')
+    if not since or scope_for_user(current_user)[0] != SCOPE_GLOBAL:
+        return _export(report_format)
+
+    try:
+        since = datetime.fromisoformat(since.replace('Z', '+00:00'))
+    except ValueError:
+        return {'error': 'Parámetro since inválido, usa formato ISO 8601'}, 400
+    if since.tzinfo:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+
+    watermark = datetime.utcnow() - SINCE_OVERLAP
+    output = tempfile.TemporaryFile()
+    writer, download_name, mimetype = FORMATS[report_format]
+    writer(current_user, output, since=since)
     output.seek(0)
+    response = send_file(output, download_name=download_name, mimetype=mimetype, as_attachment=True)
+    response.headers['X-Export-Watermark'] = watermark.isoformat()
+    response.headers['X-Export-Mode'] = 'incremental'
+    return response
+
+@bp.route('/reports', methods=['POST'])
+@login_required
+def create_report():
+    report_format = request.form.get('format', '')
+    if report_format not in FORMATS:
+        return {'error': 'Formato no válido'}, 400
+    if report_format in COLUMNAR_FORMATS and not columnar_available():
+        return {'error': 'La exportación a Parquet/Arrow requiere instalar pyarrow'}, 501
+    return _job_response(report_jobs.enqueue(report_format, current_user))
+
+@bp.route('/reports/<job_id>')
+@login_required
+def report_status(job_id):
+    job = report_jobs.get_job(job_id)
+    if not job or not report_jobs.can_access(job, current_user):
+        abort(404)
+    return report_jobs.public(job)
+
+@bp.route('/reports/<job_id>/download')
+@login_required
+def download_report(job_id):
+    job = report_jobs.get_job(job_id)
+    if not job or not report_jobs.can_access(job, current_user):
+        abort(404)
+    if job['status'] != report_jobs.STATUS_DONE:
+        return {'error': 'El reporte aún no está listo'}, 409
     
-    return send_file(output, download_name='reporte_tickets.pdf', as_attachment=True)
+    path = report_jobs.artifact_path(current_app.config['REPORTS_FOLDER'], job)
+    if not os.path.exists(path):
+        abort(404)  # Evicted from the cache
+    return _send_report(path, job['format'])
 
 @bp.route('/search')
 @login_required
 def search():
-    query = request.args.get('q', '')
+    query = request.args.get('q', '').strip()
     if not query:
         return redirect(url_for('main.index'))
+    page = request.args.get('page', 1, type=int)
     
-    # Search tickets
-    tickets = Ticket.query.filter(
-        db.or_(
-            Ticket.title.ilike(f'%{query}%'),
-            Ticket.description.ilike(f'%{query}%'),
-            Ticket.id.ilike(f'%{query}%')
-        )
-    ).all()
+    # Search tickets (full-text, ranked, only those visible to the user)
+    results = search_tickets(query, current_user, page=page)
+    
+    # A full ticket number goes straight to the ticket
+    if TICKET_NUMBER_RE.match(query) and len(results.exact) == 1:
+        return redirect(url_for('main.ticket_detail', id=results.exact[0].id))
     
-    # Search users (only for admin/tech)
+    # Search users (only for admin/tech), from the cached roster
     users = []
-    if current_user.role in ['admin', 'tecnico']:
-        users = User.query.filter(
-            db.or_(
-                User.username.ilike(f'%{query}%'),
-                User.email.ilike(f'%{query}%')
-            )
-        ).all()
+    if current_user.role in ['admin', 'tecnico'] and page == 1:
+        needle = query.lower()
+        users = [u for u in get_roster().values()
+                 if needle in u.username.lower() or needle in (u.email or '').lower()][:SEARCH_PAGE_SIZE]
         
-    return render_template('search_results.html', query=query, tickets=tickets, users=users)
+    return render_template('search_results.html', query=query, exact=results.exact, tickets=results.items,
+                           page=results.page, has_next=results.has_next, users=users)
+
+@bp.route('/api/suggest')
+@login_required
+@limiter.limit("600 per minute")  # Called on every keystroke
+def suggest():
+    query = request.args.get('q', '')
+    limit = min(request.args.get('limit', 8, type=int), 20)
+    return {'suggestions': get_suggestions(query, current_user, limit=limit)}
 
 @bp.route('/profile', methods=['GET', 'POST'])
 @login_required
@@ -479,6 +462,7 @@ def profile():
             # Update user profile picture
             current_user.profile_picture = filename
             db.session.commit()
+            invalidate_roster()
             
             success('Foto de perfil actualizada exitosamente!')
         
@@ -0,0 +1,109 @@
+"""
+Socket.IO message queue for running several worker processes.
+
+With SOCKETIO_MESSAGE_QUEUE set, every emit is also published to the other
+workers, so an event reaches its client whichever process holds the
+connection. A redis://, amqp://, kafka:// or zmq URL uses the broker
+support built into Flask-SocketIO. 'database' needs no extra service: events
+are appended to the socket_io_message table of the app database and every
+worker polls it for the rows it has not delivered yet.
+"""
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, select
+from socketio import PubSubManager
+from app import db
+from app.models import SocketIOMessage
+
+POLL_BATCH = 500
+# Rows of transactions that commit out of id order show up late; an id still
+# missing after this many seconds is taken as a rolled back insert
+GAP_TIMEOUT = 2.0
+RETENTION = timedelta(seconds=60)  # How long published events stay in the table
+CLEANUP_INTERVAL = 30
+
+class DatabaseManager(PubSubManager):
+    """Socket.IO client manager that uses a database table as its pub/sub channel."""
+    name = 'database'
+
+    def __init__(self, app, poll_interval=0.1, channel='flask-socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.app = app
+        self.poll_interval = poll_interval
+        self._engine = None
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            with self.app.app_context():
+                self._engine = db.engine
+        return self._engine
+
+    def _publish(self, data):
+        with self.engine.begin() as conn:
+            conn.execute(insert(SocketIOMessage).values(payload=self.json.dumps(data),
+                                                        created_at=datetime.utcnow()))
+
+    def _cleanup(self):
+        with self.engine.begin() as conn:
+            conn.execute(delete(SocketIOMessage).where(SocketIOMessage.created_at < datetime.utcnow() - RETENTION))
+
+    def _listen(self):
+        """Poll the table and yield each new payload once, in id order."""
+        with self.engine.connect() as conn:
+            floor = conn.execute(select(func.max(SocketIOMessage.id))).scalar() or 0
+        seen = set()  # Ids above floor already delivered
+        gap_since = None
+        last_cleanup = time.monotonic()
+
+        while True:
+            try:
+                with self.engine.connect() as conn:
+                    rows = conn.execute(
+                        select(SocketIOMessage.id, SocketIOMessage.payload)
+                        .where(SocketIOMessage.id > floor)
+                        .order_by(SocketIOMessage.id)
+                        .limit(POLL_BATCH)).all()
+            except Exception:
+                self._get_logger().exception('Cannot read the database message queue')
+                rows = []
+
+            for id, payload in rows:
+                if id not in seen:
+                    seen.add(id)
+                    yield payload
+
+            # Move the floor over the ids delivered without holes
+            while floor + 1 in seen:
+                floor += 1
+                seen.discard(floor)
+            if seen:
+                if gap_since is None:
+                    gap_since = time.monotonic()
+                elif time.monotonic() - gap_since > GAP_TIMEOUT:
+                    floor = min(seen)
+                    seen = {id for id in seen if id > floor}
+                    gap_since = None
+                    continue
+            else:
+                gap_since = None
+
+            if time.monotonic() - last_cleanup > CLEANUP_INTERVAL:
+                last_cleanup = time.monotonic()
+                try:
+                    self._cleanup()
+                except Exception:
+                    self._get_logger().exception('Cannot clean up the database message queue')
+
+            if len(rows) < POLL_BATCH:
+                self.server.sleep(self.poll_interval)
+
+def client_manager_options(app):
+    """Keyword arguments for socketio.init_app() that set up the configured message queue."""
+    url = app.config.get('SOCKETIO_MESSAGE_QUEUE')
+    if not url:
+        # Passed explicitly so a manager from an earlier create_app() is not reused
+        return {'client_manager': None}
+    if url == 'database':
+        return {'client_manager': DatabaseManager(app, app.config['SOCKETIO_QUEUE_POLL'])}
+    return {'message_queue': url}
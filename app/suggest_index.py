@@ -0,0 +1,236 @@
+"""
+In-memory prefix index for search-box suggestions.
+
+Usernames, emails, ticket numbers and ticket title words are kept in a
+sorted array of (key, kind, id) entries; a prefix lookup is a binary search
+followed by a short forward scan. The index is built once per worker (in
+the background at startup, or on first use) and kept up to date by ORM
+events after each commit. SUGGEST_INDEX_TTL rebuilds it periodically so
+changes made by other workers are picked up; changes committed while a
+rebuild is loading are buffered and replayed onto the new index before it
+replaces the old one, since the load may not have seen them.
+"""
+import re
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from threading import Lock
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from app import db, socketio
+from app.models import User, Ticket
+
+MIN_QUERY_LENGTH = 2
+MIN_TOKEN_LENGTH = 3
+MAX_TITLE_TOKENS = 8
+MAX_SCAN = 500  # Entries examined per lookup, keeps latency bounded for filtered users
+
+def normalize(text):
+    """Lowercase and strip accents, so 'Impresión' is found typing 'impresion'."""
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+def _title_tokens(title):
+    tokens = [t for t in re.findall(r'\w+', normalize(title)) if len(t) >= MIN_TOKEN_LENGTH]
+    return list(dict.fromkeys(tokens))[:MAX_TITLE_TOKENS]
+
+class PrefixIndex:
+    """Sorted (key, kind, id) entries plus the data needed to render suggestions."""
+
+    def __init__(self):
+        self.entries = []
+        self.users = {}    # {id: (username, email)}
+        self.tickets = {}  # {id: (ticket_number, title, created_by_id)}
+
+    def _keys(self, kind, id):
+        if kind == 'user':
+            username, email = self.users[id]
+            return {normalize(username), normalize(email)} - {''}
+        number, title, _ = self.tickets[id]
+        return ({normalize(number)} | set(_title_tokens(title))) - {''}
+
+    def build(self, users, tickets):
+        """Bulk load from (id, username, email) and (id, number, title, created_by_id) rows."""
+        self.users = {id: (username, email) for id, username, email in users}
+        self.tickets = {id: (number or '', title or '', created_by_id) for id, number, title, created_by_id in tickets}
+        entries = [(key, 'user', id) for id in self.users for key in self._keys('user', id)]
+        entries += [(key, 'ticket', id) for id in self.tickets for key in self._keys('ticket', id)]
+        entries.sort()
+        self.entries = entries
+
+    def remove(self, kind, id):
+        data = self.users if kind == 'user' else self.tickets
+        if id not in data:
+            return
+        for key in self._keys(kind, id):
+            i = bisect_left(self.entries, (key, kind, id))
+            if i < len(self.entries) and self.entries[i] == (key, kind, id):
+                del self.entries[i]
+        del data[id]
+
+    def put(self, kind, id, values):
+        self.remove(kind, id)
+        (self.users if kind == 'user' else self.tickets)[id] = values
+        for key in self._keys(kind, id):
+            insort(self.entries, (key, kind, id))
+
+    def lookup(self, query, user, limit):
+        tokens = normalize(query).split()
+        if not tokens:
+            return []
+        # Probe the index with the longest word, the most selective one
+        prefix = max(tokens, key=len)
+        others = list(tokens)
+        others.remove(prefix)
+        # User suggestions link to the admin-only edit page
+        include_users = user.role == 'admin'
+
+        results, seen = [], set()
+        i = bisect_left(self.entries, (prefix,))
+        end = min(len(self.entries), i + MAX_SCAN)
+        while i < end and len(results) < limit:
+            key, kind, id = self.entries[i]
+            i += 1
+            if not key.startswith(prefix):
+                break
+            if (kind, id) in seen:
+                continue
+            seen.add((kind, id))
+
+            if kind == 'user':
+                if not include_users:
+                    continue
+                username, email = self.users[id]
+                label, detail, url_id = username, email, id
+            else:
+                number, title, created_by_id = self.tickets[id]
+                if user.role == 'usuario' and created_by_id != user.id:
+                    continue
+                label, detail, url_id = number, title, id
+
+            # The other words of the query must appear in the suggestion too
+            text = normalize(f'{label} {detail}')
+            if all(word in text for word in others):
+                results.append({'type': kind, 'id': url_id, 'label': label, 'detail': detail})
+        return results
+
+_lock = Lock()        # Guards _index and its mutations
+_build_lock = Lock()  # Serializes (re)builds, which run without holding _lock
+_index = None
+_built_at = 0
+_rebuilding = False
+_pending = None  # Changes committed while a (re)build is loading, None when none runs
+
+def _load():
+    max_tickets = current_app.config.get('SUGGEST_MAX_TICKETS', 200000)
+    users = db.session.query(User.id, User.username, User.email).all()
+    # Most recent tickets only, to bound memory on very large tables
+    tickets = db.session.query(Ticket.id, Ticket.ticket_number, Ticket.title, Ticket.created_by_id) \
+        .order_by(Ticket.id.desc()).limit(max_tickets).yield_per(10000)
+    index = PrefixIndex()
+    index.build(users, tickets)
+    return index
+
+def rebuild(only_if_missing=False):
+    """Build a fresh index from the database and swap it in."""
+    global _index, _built_at, _rebuilding, _pending
+    with _build_lock:
+        if only_if_missing and _index is not None:
+            return
+        with _lock:
+            _pending = []
+        try:
+            index = _load()
+            with _lock:
+                _apply(index, _pending)
+                _index = index
+                _built_at = time.monotonic()
+        finally:
+            with _lock:
+                _pending = None
+            _rebuilding = False
+
+def get_index():
+    """
+    Return the worker's index. The first call builds it; once it is older
+    than SUGGEST_INDEX_TTL the current one keeps serving while a new one is
+    built in the background.
+    """
+    global _rebuilding
+    ttl = current_app.config.get('SUGGEST_INDEX_TTL', 900)
+    with _lock:
+        index = _index
+        expired = index is not None and not _rebuilding and time.monotonic() - _built_at > ttl
+        if expired:
+            _rebuilding = True
+
+    if index is None:
+        rebuild(only_if_missing=True)
+        return _index
+
+    if expired:
+        warm_up(current_app._get_current_object())
+    return index
+
+def suggest(query, user, limit=8):
+    """Return up to limit suggestions for a partially typed query."""
+    if len(query.strip()) < MIN_QUERY_LENGTH:
+        return []
+    index = get_index()
+    with _lock:
+        return index.lookup(query, user, limit)
+
+def warm_up(app):
+    """Build the index in the background so the first keystroke is fast."""
+    def build():
+        with app.app_context():
+            try:
+                rebuild()
+            except Exception as e:
+                print(f"Error building suggestion index: {e}")
+            finally:
+                db.session.remove()
+    socketio.start_background_task(build)
+
+# Incremental updates: collect changed rows at flush, apply them after commit
+def _queue(target, op):
+    session = object_session(target)
+    if session is None:
+        return
+    if isinstance(target, User):
+        change = ('user', target.id, (target.username, target.email))
+    else:
+        change = ('ticket', target.id, (target.ticket_number or '', target.title or '', target.created_by_id))
+    session.info.setdefault('suggest_changes', []).append((op,) + change)
+
+for model in (User, Ticket):
+    event.listen(model, 'after_insert', lambda mapper, conn, target: _queue(target, 'put'))
+    event.listen(model, 'after_update', lambda mapper, conn, target: _queue(target, 'put'))
+    event.listen(model, 'after_delete', lambda mapper, conn, target: _queue(target, 'remove'))
+
+def _apply(index, changes):
+    for op, kind, id, values in changes:
+        if op == 'put':
+            index.put(kind, id, values)
+        else:
+            index.remove(kind, id)
+
+@event.listens_for(Session, 'after_commit')
+def _apply_changes(session):
+    # Savepoints fire this too; their changes are applied with the outer commit
+    if session.in_nested_transaction():
+        return
+    changes = session.info.pop('suggest_changes', None)
+    if not changes:
+        return
+    with _lock:
+        if _index is not None:
+            _apply(_index, changes)
+        if _pending is not None:
+            _pending.extend(changes)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    if not session.in_nested_transaction():
+        session.info.pop('suggest_changes', None)
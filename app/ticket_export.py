@@ -0,0 +1,250 @@
+"""
+Ticket report exports.
+
+Rows are read with a query that joins the creator and assignee usernames,
+in keyset batches over (created_at, id): each batch is its own bounded
+query, so an export never holds the whole table (or one ORM object per
+ticket) in memory. A single streamed query would not do that here, since
+mysql-connector has no server-side cursors and buffers the whole result.
+"""
+import csv
+import importlib.util
+import io
+import os
+from datetime import timedelta
+from itertools import chain, islice
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from app.models import Ticket, User
+from app.utils.pagination import keyset_batches
+
+HEADERS = ['ID', 'Título', 'Estado', 'Prioridad', 'Creado Por', 'Asignado A', 'Fecha']
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+BATCH_SIZE = 1000
+WIDTH_SAMPLE_ROWS = 500  # Rows used to size the Excel columns
+MAX_COLUMN_WIDTH = 60
+PDF_COLUMN_WIDTHS = [14, 54, 20, 18, 26, 26, 32]  # mm, A4 width minus margins
+COLUMNAR_BATCH_SIZE = 50000  # Rows per Parquet row group / Arrow record batch
+# Incremental exports return a watermark this far in the past, so tickets written by
+# transactions still open when the export ran are sent again on the next pull
+SINCE_OVERLAP = timedelta(minutes=1)
+
+def export_query(user):
+    """Select the report columns of the tickets a user can export."""
+    creator = aliased(User)
+    assignee = aliased(User)
+    query = select(
+        Ticket.id, Ticket.title, Ticket.status, Ticket.priority,
+        creator.username, assignee.username, Ticket.created_at,
+    ).outerjoin(creator, Ticket.created_by_id == creator.id) \
+     .outerjoin(assignee, Ticket.assigned_to_id == assignee.id)
+
+    if user.role == 'tecnico':
+        query = query.where(Ticket.assigned_to_id == user.id)
+    elif user.role == 'usuario':
+        query = query.where(Ticket.created_by_id == user.id)
+    return query
+
+def iter_rows(user, batch_size=BATCH_SIZE, progress=None):
+    """
+    Yield report rows as lists of display values, read batch_size at a time.
+    progress(rows_done) is called after every batch.
+    """
+    done = 0
+    # Follows the (scope, created_at) indexes, so batches come out without a sort
+    for rows in keyset_batches(export_query(user), Ticket.created_at, Ticket.id, batch_size):
+        for id, title, status, priority, created_by, assigned_to, created_at in rows:
+            yield [
+                id, title, status, priority, created_by,
+                assigned_to or 'Sin asignar',
+                created_at.strftime(DATE_FORMAT) if created_at else '',
+            ]
+        done += len(rows)
+        if progress:
+            progress(done)
+    if progress:
+        progress(done)
+
+def csv_chunks(user, batch_size=BATCH_SIZE, progress=None):
+    """Yield the CSV report (UTF-8 with BOM, for Excel) in chunks of batch_size rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(HEADERS)
+    # Send the header before running the query, so the download starts at once
+    yield buffer.getvalue().encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+
+    rows = 0
+    for row in iter_rows(user, batch_size, progress):
+        writer.writerow(row)
+        rows += 1
+        if rows % batch_size == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+def write_csv(user, output, progress=None):
+    """Write the CSV report to a binary file."""
+    for chunk in csv_chunks(user, progress=progress):
+        output.write(chunk)
+
+def write_excel(user, output, progress=None):
+    """
+    Write the Excel report with a write-only workbook, which streams rows to
+    disk instead of keeping every cell in memory. Column widths are taken
+    from the first WIDTH_SAMPLE_ROWS rows, since they must be set before any
+    row is written.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.drawing.image import Image as XLImage
+    from openpyxl.styles import Font, Alignment, Border, Side
+    from openpyxl.utils import get_column_letter
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet('Tickets')
+
+    rows = iter_rows(user, progress=progress)
+    sample = list(islice(rows, WIDTH_SAMPLE_ROWS))
+    for i, header in enumerate(HEADERS):
+        longest = max([len(header)] + [len(str(row[i])) for row in sample])
+        worksheet.column_dimensions[get_column_letter(i + 1)].width = min(longest + 2, MAX_COLUMN_WIDTH)
+
+    # Logo and title, data table starts on row 4
+    logo_path = os.path.join(current_app.root_path, 'static', 'logo.png')
+    if os.path.exists(logo_path):
+        img = XLImage(logo_path)
+        img.height = 50
+        img.width = 50
+        worksheet.add_image(img, 'A1')
+
+    title = WriteOnlyCell(worksheet, 'HELP DESK')
+    title.font = Font(size=20, bold=True)
+    title.alignment = Alignment(vertical='center')
+    subtitle = WriteOnlyCell(worksheet, 'Reporte de Tickets')
+    subtitle.font = Font(size=14)
+    worksheet.append([None, title])
+    worksheet.append([None, subtitle])
+    worksheet.append([])
+
+    thin = Side(style='thin')
+    header_cells = []
+    for header in HEADERS:
+        cell = WriteOnlyCell(worksheet, header)
+        cell.font = Font(bold=True)
+        cell.alignment = Alignment(horizontal='center')
+        cell.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+        header_cells.append(cell)
+    worksheet.append(header_cells)
+
+    count = 0
+    for row in chain(sample, rows):
+        worksheet.append(row)
+        count += 1
+
+    worksheet.auto_filter.ref = f'A4:{get_column_letter(len(HEADERS))}{4 + count}'
+    workbook.save(output)
+
+def write_pdf(user, output, progress=None):
+    """Write the PDF report to a binary file, page by page."""
+    from app.pdf_report import PdfTableWriter
+
+    logo_path = os.path.join(current_app.root_path, 'static', 'logo.png')
+    writer = PdfTableWriter(
+        output, HEADERS, PDF_COLUMN_WIDTHS,
+        title='HELP DESK', subtitle='Reporte de Tickets',
+        logo_path=logo_path if os.path.exists(logo_path) else None,
+        align=['C', 'L', 'C', 'C', 'C', 'C', 'C'],
+    )
+    for row in iter_rows(user, progress=progress):
+        writer.add_row(row)
+    writer.close()
+
+# Columnar exports for analytics: typed columns, ids and UTC timestamps kept as such
+def columnar_available():
+    """Parquet/Arrow exports need the optional pyarrow package."""
+    return importlib.util.find_spec('pyarrow') is not None
+
+def arrow_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ('id', pa.int64()),
+        ('ticket_number', pa.string()),
+        ('title', pa.string()),
+        ('status', pa.string()),
+        ('priority', pa.string()),
+        ('created_by_id', pa.int64()),
+        ('created_by', pa.string()),
+        ('assigned_to_id', pa.int64()),
+        ('assigned_to', pa.string()),
+        ('created_at', pa.timestamp('us', tz='UTC')),
+        ('updated_at', pa.timestamp('us', tz='UTC')),
+    ])
+
+def columnar_query(user, since=None):
+    """Select the columnar export of a user's tickets, only those changed since a datetime if given."""
+    creator = aliased(User)
+    assignee = aliased(User)
+    query = select(
+        Ticket.id, Ticket.ticket_number, Ticket.title, Ticket.status, Ticket.priority,
+        Ticket.created_by_id, creator.username, Ticket.assigned_to_id, assignee.username,
+        Ticket.created_at, Ticket.updated_at,
+    ).outerjoin(creator, Ticket.created_by_id == creator.id) \
+     .outerjoin(assignee, Ticket.assigned_to_id == assignee.id)
+
+    if user.role == 'tecnico':
+        query = query.where(Ticket.assigned_to_id == user.id)
+    elif user.role == 'usuario':
+        query = query.where(Ticket.created_by_id == user.id)
+
+    if since is not None:
+        query = query.where(Ticket.updated_at >= since)
+    return query
+
+def iter_record_batches(user, since=None, progress=None):
+    """Yield Arrow record batches of COLUMNAR_BATCH_SIZE rows, one keyset query each."""
+    import pyarrow as pa
+
+    schema = arrow_schema()
+    # Incremental pulls walk the updated_at index, full ones the created_at one
+    time_column = Ticket.updated_at if since is not None else Ticket.created_at
+    done = 0
+    for rows in keyset_batches(columnar_query(user, since), time_column, Ticket.id, COLUMNAR_BATCH_SIZE):
+        columns = zip(*rows)
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema)
+        done += len(rows)
+        if progress:
+            progress(done)
+
+def write_parquet(user, output, progress=None, since=None):
+    """Write a zstd-compressed Parquet file, one row group per batch."""
+    import pyarrow.parquet as pq
+
+    with pq.ParquetWriter(output, arrow_schema(), compression='zstd') as writer:
+        for batch in iter_record_batches(user, since, progress):
+            writer.write_batch(batch)
+
+def write_arrow(user, output, progress=None, since=None):
+    """Write a zstd-compressed Arrow IPC file."""
+    import pyarrow as pa
+
+    options = pa.ipc.IpcWriteOptions(compression='zstd')
+    with pa.ipc.new_file(output, arrow_schema(), options=options) as writer:
+        for batch in iter_record_batches(user, since, progress):
+            writer.write_batch(batch)
+
+# Report formats: (writer, download name, mimetype)
+FORMATS = {
+    'csv': (write_csv, 'reporte_tickets.csv', 'text/csv'),
+    'xlsx': (write_excel, 'reporte_tickets.xlsx',
+             'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'pdf': (write_pdf, 'reporte_tickets.pdf', 'application/pdf'),
+    'parquet': (write_parquet, 'tickets.parquet', 'application/vnd.apache.parquet'),
+    'arrow': (write_arrow, 'tickets.arrow', 'application/vnd.apache.arrow.file'),
+}
+COLUMNAR_FORMATS = ('parquet', 'arrow')
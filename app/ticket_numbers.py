@@ -0,0 +1,80 @@
+"""
+Ticket number allocation from a per-year sequence row.
+
+Each allocation is a single atomic UPDATE on the TicketSequence row of the
+year, run in its own short transaction so the row lock is released before
+the ticket is inserted. Workers can reserve a block of numbers at once
+(TICKET_NUMBER_BLOCK_SIZE) and hand them out from memory; numbers from
+different workers may then interleave, and unused ones are skipped when the
+worker restarts.
+"""
+from datetime import datetime
+from threading import Lock
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Ticket, TicketSequence
+
+_block_lock = Lock()
+_blocks = {}  # {year: [next_value, last_value]} reserved by this process
+
+def format_ticket_number(year, value):
+    return f'TKT-{year}-{value:05d}'
+
+def _seed_value(conn, year):
+    """Highest number already used in a year, for sequences created on existing data."""
+    prefix = f'TKT-{year}-'
+    # Range instead of LIKE so the ticket_number index is used on every backend.
+    # Longest first: past 99999 numbers get a sixth digit and sort lower as strings
+    last = conn.execute(
+        db.select(Ticket.ticket_number).where(
+            Ticket.ticket_number >= prefix, Ticket.ticket_number < f'TKT-{year}.'
+        ).order_by(db.func.length(Ticket.ticket_number).desc(), Ticket.ticket_number.desc()).limit(1)
+    ).scalar()
+    return int(last.split('-')[2]) if last else 0
+
+def reserve(year, count=1):
+    """
+    Atomically reserve count numbers of a year.
+    Returns (first, last) of the reserved range.
+    """
+    table = TicketSequence.__table__
+    increment = table.update().where(table.c.year == year).values(last_value=table.c.last_value + count)
+    select_last = db.select(table.c.last_value).where(table.c.year == year)
+
+    with db.engine.begin() as conn:
+        if conn.execute(increment).rowcount:
+            last = conn.execute(select_last).scalar()
+            return last - count + 1, last
+
+    # First ticket of the year: create the sequence row
+    try:
+        with db.engine.begin() as conn:
+            last = _seed_value(conn, year) + count
+            conn.execute(table.insert().values(year=year, last_value=last))
+            return last - count + 1, last
+    except IntegrityError:
+        # Another worker created it first
+        with db.engine.begin() as conn:
+            conn.execute(increment)
+            last = conn.execute(select_last).scalar()
+            return last - count + 1, last
+
+def next_ticket_number(year=None):
+    """Return a new unique ticket number in format TKT-YYYY-NNNNN."""
+    year = year or datetime.utcnow().year
+    block_size = current_app.config.get('TICKET_NUMBER_BLOCK_SIZE', 1)
+
+    if block_size <= 1:
+        value, _ = reserve(year)
+        return format_ticket_number(year, value)
+
+    with _block_lock:
+        block = _blocks.get(year)
+        if not block or block[0] > block[1]:
+            block = list(reserve(year, block_size))
+            _blocks[year] = block
+        value = block[0]
+        block[0] += 1
+
+    return format_ticket_number(year, value)
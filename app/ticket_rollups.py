@@ -0,0 +1,174 @@
+"""
+Daily ticket rollups for trend analytics.
+
+Ticket writes add their activity to per-day rows (overall, per priority and
+per assignee), so any date range can be served from the small rollup table
+instead of scanning Ticket.created_at. Backlog is stored as a daily delta of
+non-closed tickets and accumulated when a range is read.
+"""
+from datetime import date, datetime, timedelta
+from sqlalchemy import insert
+from app import db
+from app.models import Ticket, TicketDailyRollup
+from app.utils.counters import increment
+
+DIMENSIONS = ('all', 'priority', 'assignee')
+MAX_RANGE_DAYS = 731
+
+def _buckets(state):
+    """Return the (dimension, bucket) pairs a ticket state is counted in."""
+    return [
+        ('all', ''),
+        ('priority', state['priority']),
+        ('assignee', str(state['assigned_to_id'] or 0)),
+    ]
+
+def _is_open(state):
+    return state['status'] != 'cerrado'
+
+def record_change(old_state, new_state, day=None):
+    """
+    Add the activity of a ticket moving from old_state to new_state to the
+    rollups of the given day (today by default). States are the snapshots
+    from app.ticket_stats. Does not commit.
+    """
+    day = day or datetime.utcnow().date()
+    deltas = {}
+
+    def add(bucket, column, value):
+        bucket_deltas = deltas.setdefault(bucket, {})
+        bucket_deltas[column] = bucket_deltas.get(column, 0) + value
+
+    if old_state and _is_open(old_state):
+        for bucket in _buckets(old_state):
+            add(bucket, 'backlog_delta', -1)
+
+    if new_state:
+        for bucket in _buckets(new_state):
+            if old_state is None:
+                add(bucket, 'created', 1)
+            if _is_open(new_state):
+                add(bucket, 'backlog_delta', 1)
+            elif old_state is None or _is_open(old_state):
+                add(bucket, 'closed', 1)
+
+    for (dimension, bucket), bucket_deltas in deltas.items():
+        changed = {column: delta for column, delta in bucket_deltas.items() if delta}
+        if changed:
+            increment(TicketDailyRollup, {'dimension': dimension, 'bucket': bucket, 'day': day}, changed)
+
+def _as_date(value):
+    """Normalize the result of func.date(), which is a string on SQLite."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+def backfill(batch_size=5000, progress=None):
+    """
+    Rebuild all rollups from the Ticket table, grouping one id range per query.
+    Closing dates are not stored on tickets, so historical closures are
+    attributed to the day the ticket was created. Returns the tickets processed.
+    """
+    min_id, max_id = db.session.query(db.func.min(Ticket.id), db.func.max(Ticket.id)).one()
+    totals = {}
+    processed = 0
+
+    if min_id is not None:
+        for low in range(min_id, max_id + 1, batch_size):
+            rows = db.session.query(
+                db.func.date(Ticket.created_at), Ticket.status, Ticket.priority,
+                Ticket.assigned_to_id, db.func.count(Ticket.id)
+            ).filter(
+                Ticket.id >= low, Ticket.id < low + batch_size
+            ).group_by(
+                db.func.date(Ticket.created_at), Ticket.status, Ticket.priority, Ticket.assigned_to_id
+            ).all()
+
+            for created_day, status, priority, assigned_to_id, count in rows:
+                if created_day is None:
+                    continue
+                state = {
+                    'status': status or 'abierto',
+                    'priority': priority or 'media',
+                    'assigned_to_id': assigned_to_id,
+                }
+                day = _as_date(created_day)
+                for dimension, bucket in _buckets(state):
+                    values = totals.setdefault((dimension, bucket, day), [0, 0, 0])
+                    values[0] += count
+                    if _is_open(state):
+                        values[2] += count
+                    else:
+                        values[1] += count
+                processed += count
+
+            if progress:
+                progress(processed)
+
+    TicketDailyRollup.query.delete()
+    rows = [{'dimension': dimension, 'bucket': bucket, 'day': day,
+             'created': created, 'closed': closed, 'backlog_delta': backlog_delta}
+            for (dimension, bucket, day), (created, closed, backlog_delta) in totals.items()]
+    for i in range(0, len(rows), batch_size):
+        db.session.execute(insert(TicketDailyRollup), rows[i:i + batch_size])
+    db.session.commit()
+
+    return processed
+
+def get_trends(start, end, dimension='all', bucket=None):
+    """
+    Return per-day created/closed/backlog series for every bucket of a
+    dimension between start and end (inclusive), zero-filling missing days.
+    """
+    filters = [TicketDailyRollup.dimension == dimension]
+    if bucket is not None:
+        filters.append(TicketDailyRollup.bucket == bucket)
+
+    # Backlog at the start of the range
+    baseline = dict(db.session.query(
+        TicketDailyRollup.bucket, db.func.sum(TicketDailyRollup.backlog_delta)
+    ).filter(*filters, TicketDailyRollup.day < start).group_by(TicketDailyRollup.bucket).all())
+
+    rows = db.session.query(
+        TicketDailyRollup.bucket, TicketDailyRollup.day, TicketDailyRollup.created,
+        TicketDailyRollup.closed, TicketDailyRollup.backlog_delta
+    ).filter(*filters, TicketDailyRollup.day >= start, TicketDailyRollup.day <= end).all()
+
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    index = {day: i for i, day in enumerate(days)}
+    series = {}
+
+    def get_series(key):
+        if key not in series:
+            series[key] = {'created': [0] * len(days), 'closed': [0] * len(days),
+                           'backlog_delta': [0] * len(days)}
+        return series[key]
+
+    for key in baseline:
+        get_series(key)
+    for key, day, created, closed, backlog_delta in rows:
+        values = get_series(key)
+        i = index[_as_date(day)]
+        values['created'][i] = created
+        values['closed'][i] = closed
+        values['backlog_delta'][i] = backlog_delta
+
+    result = {}
+    for key, values in series.items():
+        backlog = []
+        running = int(baseline.get(key) or 0)
+        for delta in values.pop('backlog_delta'):
+            running += delta
+            backlog.append(running)
+        values['backlog'] = backlog
+        result[key] = values
+
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'dimension': dimension,
+        'dates': [day.isoformat() for day in days],
+        'series': result
+    }
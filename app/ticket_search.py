@@ -0,0 +1,134 @@
+"""
+Full-text ticket search.
+
+Titles and descriptions are indexed with a FULLTEXT index on MySQL and an
+FTS5 table kept in sync by triggers on SQLite, so searches use the index
+and are ranked by relevance instead of scanning every ticket with ILIKE.
+Ticket numbers and ids are matched exactly before the full-text search.
+"""
+import re
+from collections import namedtuple
+from sqlalchemy import event, DDL
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models import Ticket
+
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE = 50  # Relevance pages beyond this are not useful and cost deep OFFSETs
+MAX_TERMS = 10
+MYSQL_MIN_TOKEN_SIZE = 3  # innodb_ft_min_token_size default
+
+TICKET_NUMBER_RE = re.compile(r'^TKT-\d{4}-\d+$', re.IGNORECASE)
+TICKET_ID_RE = re.compile(r'^#?(\d+)$')
+
+SearchResults = namedtuple('SearchResults', ['exact', 'items', 'page', 'has_next'])
+
+# SQLite: external-content FTS5 table over ticket, maintained by triggers
+SQLITE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS ticket_fts USING fts5("
+    "title, description, content='ticket', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS ticket_fts_ai AFTER INSERT ON ticket BEGIN "
+    "INSERT INTO ticket_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS ticket_fts_ad AFTER DELETE ON ticket BEGIN "
+    "INSERT INTO ticket_fts(ticket_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS ticket_fts_au AFTER UPDATE OF title, description ON ticket BEGIN "
+    "INSERT INTO ticket_fts(ticket_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO ticket_fts(rowid, title, description) VALUES (new.id, new.title, new.description); END",
+    "INSERT INTO ticket_fts(ticket_fts) VALUES ('rebuild')",
+]
+
+for statement in SQLITE_FTS_DDL:
+    event.listen(Ticket.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(Ticket.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS ticket_fts').execute_if(dialect='sqlite'))
+
+def setup_search_index():
+    """
+    Create the full-text structures on an existing database and index the
+    current tickets. Returns a description of what was done.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        with db.engine.begin() as conn:
+            for statement in SQLITE_FTS_DDL:
+                conn.exec_driver_sql(statement)
+        return 'Tabla FTS5 ticket_fts y triggers creados, índice reconstruido'
+
+    if dialect == 'mysql':
+        existing = {index['name'] for index in db.inspect(db.engine).get_indexes('ticket')}
+        if 'ft_ticket_title_description' in existing:
+            return 'El índice FULLTEXT ya existe'
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql(
+                'ALTER TABLE ticket ADD FULLTEXT INDEX ft_ticket_title_description (title, description)')
+        return 'Índice FULLTEXT ft_ticket_title_description creado'
+
+    return f'Búsqueda de texto completo no soportada en {dialect}, se usará LIKE'
+
+def _terms(query):
+    """Split a query into plain word tokens, dropping any search operators."""
+    return re.findall(r'\w+', query, re.UNICODE)[:MAX_TERMS]
+
+def _visible(query, user):
+    """Restrict a ticket query to what a user can see."""
+    if user.role == 'usuario':
+        return query.filter(Ticket.created_by_id == user.id)
+    return query
+
+def find_exact(query, user):
+    """Return the tickets whose number or id is exactly the query."""
+    query = query.strip()
+    if TICKET_NUMBER_RE.match(query):
+        return _visible(Ticket.query.filter_by(ticket_number=query.upper()), user).all()
+
+    id_match = TICKET_ID_RE.match(query)
+    if id_match:
+        return _visible(Ticket.query.filter_by(id=int(id_match.group(1))), user).all()
+    return []
+
+def _ranked_ids(terms, user, limit, offset):
+    """Ids of matching tickets ordered by relevance."""
+    dialect = db.engine.dialect.name
+
+    if dialect == 'sqlite':
+        sql = ('SELECT ticket.id FROM ticket_fts JOIN ticket ON ticket.id = ticket_fts.rowid '
+               'WHERE ticket_fts MATCH :match')
+        params = {'match': ' '.join(f'"{term}"*' for term in terms), 'limit': limit, 'offset': offset}
+        if user.role == 'usuario':
+            sql += ' AND ticket.created_by_id = :user_id'
+            params['user_id'] = user.id
+        # Title matches weigh more than description matches
+        sql += ' ORDER BY bm25(ticket_fts, 10.0, 1.0), ticket.id DESC LIMIT :limit OFFSET :offset'
+        return [row[0] for row in db.session.execute(db.text(sql), params)]
+
+    if dialect == 'mysql':
+        terms = [term for term in terms if len(term) >= MYSQL_MIN_TOKEN_SIZE]
+        if not terms:
+            return []
+        relevance = match(Ticket.title, Ticket.description,
+                          against=' '.join(f'+{term}*' for term in terms)).in_boolean_mode()
+        query = _visible(db.session.query(Ticket.id).filter(relevance), user)
+        return [row[0] for row in query.order_by(relevance.desc(), Ticket.id.desc()).limit(limit).offset(offset)]
+
+    # Other backends: unindexed substring match
+    query = _visible(db.session.query(Ticket.id), user)
+    for term in terms:
+        query = query.filter(db.or_(Ticket.title.ilike(f'%{term}%'), Ticket.description.ilike(f'%{term}%')))
+    return [row[0] for row in query.order_by(Ticket.id.desc()).limit(limit).offset(offset)]
+
+def search_tickets(query, user, page=1, per_page=SEARCH_PAGE_SIZE):
+    """Search the tickets visible to a user. Returns SearchResults for one page."""
+    page = min(max(page, 1), MAX_SEARCH_PAGE)
+    exact = find_exact(query, user) if page == 1 else []
+
+    terms = _terms(query)
+    ids = _ranked_ids(terms, user, per_page + 1, (page - 1) * per_page) if terms else []
+    has_next = len(ids) > per_page and page < MAX_SEARCH_PAGE
+    ids = ids[:per_page]
+
+    tickets = Ticket.query.options(joinedload(Ticket.created_by)).filter(Ticket.id.in_(ids)).all() if ids else []
+    by_id = {ticket.id: ticket for ticket in tickets}
+    exact_ids = {ticket.id for ticket in exact}
+    items = [by_id[id] for id in ids if id in by_id and id not in exact_ids]
+
+    return SearchResults(exact, items, page, has_next)
@@ -0,0 +1,180 @@
+"""
+Incrementally maintained ticket counters for the dashboard.
+
+Every ticket write adjusts the counters of the scopes it belongs to (global,
+its assignee and its creator) in the same transaction, so the dashboard can be
+answered with a single primary-key lookup instead of seven COUNT(*) queries.
+Changed scopes are then pushed to their Socket.IO rooms with the new numbers.
+"""
+from threading import Lock
+from flask import current_app
+from app import db, socketio
+from app.models import Ticket, TicketStatCounter
+from app.utils.counters import increment
+
+STATUSES = ('abierto', 'en_proceso', 'cerrado')
+PRIORITIES = ('alta', 'media', 'baja')
+
+SCOPE_GLOBAL = 'global'
+SCOPE_ASSIGNEE = 'assignee'
+SCOPE_CREATOR = 'creator'
+
+def snapshot(ticket):
+    """Capture the fields of a ticket that affect the counters."""
+    return {
+        'status': ticket.status or 'abierto',
+        'priority': ticket.priority or 'media',
+        'assigned_to_id': ticket.assigned_to_id,
+        'created_by_id': ticket.created_by_id,
+    }
+
+def _scopes(state):
+    """Return the (scope, scope_id) pairs a ticket state is counted in."""
+    scopes = [(SCOPE_GLOBAL, 0)]
+    if state['assigned_to_id']:
+        scopes.append((SCOPE_ASSIGNEE, state['assigned_to_id']))
+    if state['created_by_id']:
+        scopes.append((SCOPE_CREATOR, state['created_by_id']))
+    return scopes
+
+def _columns(state):
+    """Return the counter columns a ticket state contributes to."""
+    columns = ['total']
+    if state['status'] in STATUSES:
+        columns.append(state['status'])
+    if state['priority'] in PRIORITIES:
+        columns.append(state['priority'])
+    return columns
+
+def _accumulate(deltas, state, sign):
+    for scope in _scopes(state):
+        scope_deltas = deltas.setdefault(scope, {})
+        for column in _columns(state):
+            scope_deltas[column] = scope_deltas.get(column, 0) + sign
+
+def record_change(old_state, new_state):
+    """
+    Apply the counter deltas for a ticket moving from old_state to new_state.
+    Either state can be None (ticket created / deleted). Does not commit, so
+    the caller's commit makes the counters and the ticket visible together.
+    Returns the scopes whose counters changed.
+    """
+    deltas = {}
+    if old_state:
+        _accumulate(deltas, old_state, -1)
+    if new_state:
+        _accumulate(deltas, new_state, +1)
+
+    changed_scopes = []
+    for (scope, scope_id), scope_deltas in deltas.items():
+        changed = {column: delta for column, delta in scope_deltas.items() if delta}
+        if changed:
+            increment(TicketStatCounter, {'scope': scope, 'scope_id': scope_id}, changed)
+            changed_scopes.append((scope, scope_id))
+
+    return changed_scopes
+
+def scope_for_user(user):
+    """Return the counter scope a user's dashboard is based on."""
+    if user.role == 'tecnico':
+        return SCOPE_ASSIGNEE, user.id
+    if user.role == 'usuario':
+        return SCOPE_CREATOR, user.id
+    return SCOPE_GLOBAL, 0
+
+def get_stats(scope, scope_id):
+    """Return dashboard stats for a scope with a single primary-key lookup."""
+    counter = db.session.get(TicketStatCounter, (scope, scope_id))
+    counts = {column: getattr(counter, column) if counter else 0
+              for column in ('total',) + STATUSES + PRIORITIES}
+
+    return {
+        'total': counts['total'],
+        'open': counts['abierto'],
+        'process': counts['en_proceso'],
+        'closed': counts['cerrado'],
+        'status_data': [counts[status] for status in STATUSES],
+        'priority_data': [counts[priority] for priority in PRIORITIES]
+    }
+
+def get_stats_for_user(user):
+    """Return the dashboard stats visible to a user according to their role."""
+    return get_stats(*scope_for_user(user))
+
+def dashboard_room(scope, scope_id):
+    """Socket.IO room name for clients watching a scope's dashboard."""
+    return f'dashboard:{scope}:{scope_id}'
+
+# Scopes waiting to be pushed, coalesced during DASHBOARD_PUSH_WINDOW seconds
+_pending_scopes = set()
+_flush_scheduled = False
+_pending_lock = Lock()
+
+def publish_changes(scopes):
+    """
+    Queue a dashboard push for the given scopes. Call after commit.
+    Bursts of writes within the push window result in one emit per scope.
+    """
+    global _flush_scheduled
+    if not scopes:
+        return
+
+    with _pending_lock:
+        _pending_scopes.update(scopes)
+        if _flush_scheduled:
+            return
+        _flush_scheduled = True
+
+    socketio.start_background_task(_flush_pending, current_app._get_current_object())
+
+def _flush_pending(app):
+    """Compute the stats of every pending scope once and emit them to its room."""
+    global _flush_scheduled
+    socketio.sleep(app.config.get('DASHBOARD_PUSH_WINDOW', 0.5))
+
+    with _pending_lock:
+        scopes = list(_pending_scopes)
+        _pending_scopes.clear()
+        _flush_scheduled = False
+
+    with app.app_context():
+        try:
+            for scope, scope_id in scopes:
+                socketio.emit('dashboard_update', get_stats(scope, scope_id),
+                              to=dashboard_room(scope, scope_id))
+        except Exception as e:
+            print(f"Error pushing dashboard update: {e}")
+        finally:
+            db.session.remove()
+
+def rebuild():
+    """
+    Recompute every counter from the Ticket table with a single GROUP BY.
+    Returns the number of counter rows written.
+    """
+    rows = db.session.query(
+        Ticket.status, Ticket.priority, Ticket.assigned_to_id, Ticket.created_by_id,
+        db.func.count(Ticket.id)
+    ).group_by(
+        Ticket.status, Ticket.priority, Ticket.assigned_to_id, Ticket.created_by_id
+    ).all()
+
+    counters = {}
+    for status, priority, assigned_to_id, created_by_id, count in rows:
+        state = {
+            'status': status or 'abierto',
+            'priority': priority or 'media',
+            'assigned_to_id': assigned_to_id,
+            'created_by_id': created_by_id,
+        }
+        for scope in _scopes(state):
+            values = counters.setdefault(scope, {})
+            for column in _columns(state):
+                values[column] = values.get(column, 0) + count
+
+    TicketStatCounter.query.delete()
+    for (scope, scope_id), values in counters.items():
+        db.session.add(TicketStatCounter(scope=scope, scope_id=scope_id, **values))
+    db.session.commit()
+
+    return len(counters)
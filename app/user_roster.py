@@ -0,0 +1,48 @@
+"""
+In-process cache of the user roster (id, username, role, picture).
+
+Pages and chat events that only need to list or label users read it from
+here instead of querying the user table every time. The cache is dropped
+whenever a user is created, edited or deleted; USER_ROSTER_TTL bounds how
+stale it can get in other worker processes.
+"""
+import time
+from collections import namedtuple
+from threading import Lock
+from flask import current_app
+from app.models import User
+
+RosterUser = namedtuple('RosterUser', ['id', 'username', 'email', 'role', 'profile_picture'])
+
+_lock = Lock()
+_roster = None  # {user_id: RosterUser}, ordered by username
+_loaded_at = 0
+
+def _load():
+    users = User.query.order_by(User.username).all()
+    return {u.id: RosterUser(u.id, u.username, u.email, u.role, u.get_profile_picture()) for u in users}
+
+def get_roster():
+    """Return {user_id: RosterUser} for every user, ordered by username."""
+    global _roster, _loaded_at
+    ttl = current_app.config.get('USER_ROSTER_TTL', 300)
+
+    with _lock:
+        if _roster is None or time.monotonic() - _loaded_at > ttl:
+            _roster = _load()
+            _loaded_at = time.monotonic()
+        return _roster
+
+def get_user(user_id):
+    """Return the RosterUser of an id, or None."""
+    return get_roster().get(user_id)
+
+def get_technicians():
+    """Return the users with the 'tecnico' role, ordered by username."""
+    return [u for u in get_roster().values() if u.role == 'tecnico']
+
+def invalidate():
+    """Drop the cached roster; the next read reloads it. Call after user changes."""
+    global _roster
+    with _lock:
+        _roster = None
@@ -0,0 +1,23 @@
+"""
+Helpers for counter tables updated with atomic increments.
+"""
+from sqlalchemy.exc import IntegrityError
+from app import db
+
+def increment(model, keys, deltas):
+    """
+    Atomically add deltas to the row of model identified by keys, creating it
+    if missing. Does not commit; runs inside the caller's transaction.
+    """
+    query = model.query.filter_by(**keys)
+    values = {getattr(model, column): getattr(model, column) + delta
+              for column, delta in deltas.items()}
+    if query.update(values, synchronize_session=False):
+        return
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(model(**keys, **deltas))
+    except IntegrityError:
+        # Another transaction created the row first, retry as an update
+        query.update(values, synchronize_session=False)
@@ -0,0 +1,129 @@
+"""
+Keyset (cursor) pagination over a (timestamp, id) ordering.
+
+Pages are addressed by the position of their boundary rows instead of an
+OFFSET, so every page costs the same index range scan no matter how deep
+the user navigates.
+"""
+import base64
+from datetime import datetime
+from app import db
+
+PAGE_SIZES = (10, 25, 50, 100)
+DEFAULT_PAGE_SIZE = 25
+
+def encode_cursor(timestamp, id):
+    """Encode a (timestamp, id) position as an opaque URL-safe token."""
+    raw = f'{timestamp.isoformat()}|{id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(token):
+    """Decode a cursor token, returning None if it is missing or malformed."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        timestamp, id = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def get_page_size(value):
+    """Return a valid page size from a request argument."""
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return value if value in PAGE_SIZES else DEFAULT_PAGE_SIZE
+
+class KeysetPage:
+    """One page of results, newest first, with cursors to its neighbours."""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+def keyset_paginate(query, time_column, id_column, after=None, before=None, per_page=DEFAULT_PAGE_SIZE):
+    """
+    Return a KeysetPage of query ordered by (time_column, id_column) descending.
+    after: cursor token, return the rows older than it (next page).
+    before: cursor token, return the rows newer than it (previous page).
+    """
+    after_key = decode_cursor(after)
+    before_key = decode_cursor(before)
+
+    def key_of(item):
+        return encode_cursor(getattr(item, time_column.key), getattr(item, id_column.key))
+
+    if before_key:
+        # Walk backwards from the cursor, then restore newest-first order
+        timestamp, id = before_key
+        rows = query.filter(db.or_(
+            time_column > timestamp,
+            db.and_(time_column == timestamp, id_column > id)
+        )).order_by(time_column.asc(), id_column.asc()).limit(per_page + 1).all()
+
+        has_prev = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        return KeysetPage(
+            items, per_page,
+            next_cursor=key_of(items[-1]) if items else None,
+            prev_cursor=key_of(items[0]) if items and has_prev else None
+        )
+
+    if after_key:
+        timestamp, id = after_key
+        query = query.filter(db.or_(
+            time_column < timestamp,
+            db.and_(time_column == timestamp, id_column < id)
+        ))
+
+    rows = query.order_by(time_column.desc(), id_column.desc()).limit(per_page + 1).all()
+    has_next = len(rows) > per_page
+    items = rows[:per_page]
+    return KeysetPage(
+        items, per_page,
+        next_cursor=key_of(items[-1]) if items and has_next else None,
+        prev_cursor=key_of(items[0]) if items and after_key else None
+    )
+
+def keyset_batches(query, time_column, id_column, batch_size):
+    """
+    Yield the rows of a select ordered by (time_column, id_column) ascending,
+    as lists of up to batch_size rows. Every batch is its own query starting
+    after the last row of the previous one, so only one batch is ever in
+    memory, even with drivers that buffer the whole result of a query.
+    """
+    query = query.order_by(time_column, id_column)
+    last = None
+    while True:
+        batch = query
+        if last:
+            timestamp, id = last
+            if timestamp is None:
+                # NULL timestamps sort first
+                batch = query.where(db.or_(
+                    time_column.is_not(None),
+                    db.and_(time_column.is_(None), id_column > id)
+                ))
+            else:
+                batch = query.where(db.or_(
+                    time_column > timestamp,
+                    db.and_(time_column == timestamp, id_column > id)
+                ))
+        rows = db.session.execute(batch.limit(batch_size)).all()
+        if rows:
+            yield rows
+        if len(rows) < batch_size:
+            return
+        last = getattr(rows[-1], time_column.key), getattr(rows[-1], id_column.key)
@@ -31,6 +31,64 @@ class Config:
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or 'noreply@helpdesk.com'
     
+    # Emails go through the email_outbox table, sent by EMAIL_WORKERS threads per process
+    # in batches of EMAIL_BATCH over an SMTP connection kept open EMAIL_SMTP_IDLE seconds
+    # after the last batch, retried up to EMAIL_MAX_ATTEMPTS
+    EMAIL_WORKERS = int(os.environ.get('EMAIL_WORKERS') or 2)
+    EMAIL_BATCH = int(os.environ.get('EMAIL_BATCH') or 20)
+    EMAIL_MAX_ATTEMPTS = int(os.environ.get('EMAIL_MAX_ATTEMPTS') or 5)
+    EMAIL_POLL = int(os.environ.get('EMAIL_POLL') or 5)  # Seconds between checks for retries
+    EMAIL_SMTP_IDLE = float(os.environ.get('EMAIL_SMTP_IDLE') or 10)
+    
+    # Dashboard: seconds to coalesce ticket writes before pushing new stats
+    DASHBOARD_PUSH_WINDOW = float(os.environ.get('DASHBOARD_PUSH_WINDOW') or 0.5)
+    
+    # Ticket numbers reserved per worker at once (1 = strictly sequential, no gaps on restart)
+    TICKET_NUMBER_BLOCK_SIZE = int(os.environ.get('TICKET_NUMBER_BLOCK_SIZE') or 1)
+    
+    # Seconds the in-process user roster can be reused before reloading it
+    USER_ROSTER_TTL = int(os.environ.get('USER_ROSTER_TTL') or 300)
+    
+    # Search suggestions: seconds before each worker rebuilds its in-memory index,
+    # and how many of the most recent tickets it holds
+    SUGGEST_INDEX_TTL = int(os.environ.get('SUGGEST_INDEX_TTL') or 900)
+    SUGGEST_MAX_TICKETS = int(os.environ.get('SUGGEST_MAX_TICKETS') or 200000)
+    
+    # Report jobs: where artifacts are cached, worker processes, hours and MB the cache keeps
+    REPORTS_FOLDER = os.environ.get('REPORTS_FOLDER') or os.path.join(os.path.abspath(os.path.dirname(__file__)), 'reports')
+    REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS') or 2)
+    REPORT_RETENTION = int(os.environ.get('REPORT_RETENTION_HOURS') or 24) * 3600
+    REPORT_CACHE_MAX_MB = int(os.environ.get('REPORT_CACHE_MAX_MB') or 500)
+    
+    # Several worker processes: Socket.IO message queue ('database' uses the app database,
+    # or a redis:// / amqp:// URL) and where chat presence is kept ('memory' or 'database')
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE') or None
+    SOCKETIO_QUEUE_POLL = float(os.environ.get('SOCKETIO_QUEUE_POLL') or 0.1)
+    PRESENCE_BACKEND = os.environ.get('PRESENCE_BACKEND') or ('database' if SOCKETIO_MESSAGE_QUEUE else 'memory')
+    # Seconds without a heartbeat before a chat connection is considered gone
+    PRESENCE_TTL = int(os.environ.get('PRESENCE_TTL') or 90)
+    
+    # Chat messages sent per history page (older ones are loaded on scroll)
+    CHAT_HISTORY_PAGE_SIZE = int(os.environ.get('CHAT_HISTORY_PAGE_SIZE') or 50)
+    
+    # Chat group commit: queue messages and write them in batches every CHAT_WRITE_INTERVAL
+    # seconds or CHAT_WRITE_BATCH messages (all workers must use the same setting)
+    CHAT_WRITE_BUFFER = os.environ.get('CHAT_WRITE_BUFFER', 'false').lower() in ['true', 'on', '1']
+    CHAT_WRITE_INTERVAL = float(os.environ.get('CHAT_WRITE_INTERVAL') or 0.01)
+    CHAT_WRITE_BATCH = int(os.environ.get('CHAT_WRITE_BATCH') or 200)
+    CHAT_ID_BLOCK_SIZE = int(os.environ.get('CHAT_ID_BLOCK_SIZE') or 500)  # Largest block of ids reserved at once
+    
+    # Offline chat notifications are collected per recipient and emailed as one digest
+    # once no message arrived for CHAT_DIGEST_QUIET seconds, or CHAT_DIGEST_MAX_DELAY
+    # seconds after the first one; nothing is sent if the recipient read them first
+    CHAT_DIGEST_QUIET = int(os.environ.get('CHAT_DIGEST_QUIET') or 120)
+    CHAT_DIGEST_MAX_DELAY = int(os.environ.get('CHAT_DIGEST_MAX_DELAY') or 600)
+    CHAT_DIGEST_POLL = int(os.environ.get('CHAT_DIGEST_POLL') or 15)  # Seconds between checks
+    
+    # Chat messages older than this many days are moved to the archive table by
+    # scripts/archive_chat_messages.py (history still shows them)
+    CHAT_RETENTION_DAYS = int(os.environ.get('CHAT_RETENTION_DAYS') or 365)
+    
     # CSRF Protection
     WTF_CSRF_ENABLED = True
     WTF_CSRF_TIME_LIMIT = None  # No time limit for CSRF tokens
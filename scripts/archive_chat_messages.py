@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+Mueve los mensajes de chat antiguos a la tabla de archivo (chat_message_archive).
+
+Los mensajes enviados hace más de CHAT_RETENTION_DAYS días (365 por defecto)
+salen de chat_message en lotes pequeños, cada uno en su propia transacción,
+para no bloquear el chat. El historial los sigue mostrando al desplazarse
+hacia atrás. Pensado para ejecutarse periódicamente (cron / tarea programada).
+
+Uso:
+    py scripts/archive_chat_messages.py [--days 365] [--chunk-size 1000] [--pause 0.1] [--dry-run]
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import argparse
+import sys
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.models import ChatMessage
+from app.chat_archive import archive, boundary
+
+parser = argparse.ArgumentParser(description='Archivar mensajes de chat antiguos')
+parser.add_argument('--days', type=int, help='Antigüedad en días (default: CHAT_RETENTION_DAYS)')
+parser.add_argument('--chunk-size', type=int, default=1000, help='Mensajes por transacción (default: 1000)')
+parser.add_argument('--pause', type=float, default=0.1, help='Segundos de pausa entre lotes (default: 0.1)')
+parser.add_argument('--dry-run', action='store_true', help='Solo contar los mensajes a archivar')
+args = parser.parse_args()
+
+app = create_app()
+
+with app.app_context():
+    try:
+        days = args.days or app.config['CHAT_RETENTION_DAYS']
+        cutoff = datetime.utcnow() - timedelta(days=days)
+
+        print("=" * 60)
+        print("🗄️  ARCHIVO DE MENSAJES DE CHAT")
+        print("=" * 60)
+        print(f"   Anteriores a: {cutoff:%Y-%m-%d %H:%M} ({days} días)")
+
+        # Create the archive table if this is an existing deployment
+        db.create_all()
+
+        if args.dry_run:
+            last_id = boundary(cutoff)
+            count = ChatMessage.query.filter(ChatMessage.id <= last_id).count() if last_id else 0
+            print(f"\n📊 Mensajes a archivar: {count}")
+            sys.exit(0)
+
+        moved = archive(cutoff, chunk_size=args.chunk_size, pause=args.pause)
+
+        print(f"\n✅ Mensajes archivados: {moved}")
+    except Exception as e:
+        db.session.rollback()
+        print(f"\n❌ Error al archivar mensajes: {e}")
+        sys.exit(1)
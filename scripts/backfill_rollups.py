@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""
+Reconstruye las tablas de resúmenes diarios (tendencias) desde el historial
+de tickets, procesando los tickets por lotes de IDs.
+
+Uso:
+    py scripts/backfill_rollups.py [--batch-size 5000]
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+from app import create_app, db
+from app.ticket_rollups import backfill
+import argparse
+import sys
+
+parser = argparse.ArgumentParser(description='Reconstruir resúmenes diarios de tickets')
+parser.add_argument('--batch-size', type=int, default=5000, help='Tickets por lote (default: 5000)')
+args = parser.parse_args()
+
+app = create_app()
+
+with app.app_context():
+    try:
+        print("=" * 60)
+        print("📈 RECONSTRUCCIÓN DE RESÚMENES DIARIOS")
+        print("=" * 60)
+
+        # Create the rollup table if this is an existing deployment
+        db.create_all()
+
+        processed = backfill(
+            batch_size=args.batch_size,
+            progress=lambda count: print(f"   ... {count} tickets procesados")
+        )
+
+        print(f"\n✅ Resúmenes reconstruidos a partir de {processed} tickets")
+        print("   Nota: las fechas de cierre históricas se asignan al día de creación")
+    except Exception as e:
+        db.session.rollback()
+        print(f"\n❌ Error al reconstruir resúmenes: {e}")
+        sys.exit(1)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+Benchmark de escritura de mensajes de chat bajo ráfagas.
+
+Lanza varios procesos (como los workers del servidor), cada uno con varios
+hilos, que guardan mensajes de chat en paralelo con chat_writer.save_message.
+Compara el modo directo (un commit por mensaje) con el buffer de escritura
+agrupada (--buffer, CHAT_WRITE_BUFFER). Verifica que estén todos los mensajes,
+sin ids repetidos, y que los contadores de conversaciones coincidan.
+
+Por defecto usa una base SQLite temporal. Para MySQL pasa una base de datos
+de pruebas VACÍA (sus tablas se borran y se recrean):
+    py scripts/benchmark_chat_writer.py --database-url mysql+mysqlconnector://root@127.0.0.1/chat_bench
+
+Uso:
+    py scripts/benchmark_chat_writer.py [--messages 5000] [--workers 4] [--threads 8] [--users 20] [--buffer]
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+def make_app(database_url, buffer):
+    from config import Config
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 60}} if database_url.startswith('sqlite') else {}
+        CHAT_WRITE_BUFFER = buffer
+
+    from app import create_app
+    return create_app(BenchmarkConfig)
+
+def run_worker(database_url, buffer, user_ids, count, threads):
+    """Save count messages from threads threads. Returns (ids, errors, seconds until all are written)."""
+    from app import db, chat_writer
+
+    app = make_app(database_url, buffer)
+    rng = random.Random(os.getpid())
+    pairs = [tuple(rng.sample(user_ids, 2)) for _ in range(count)]
+
+    def send(pair):
+        with app.app_context():
+            try:
+                message_id, _ = chat_writer.save_message(pair[0], pair[1], 'Benchmark')
+                return message_id, None
+            except Exception as e:
+                db.session.rollback()
+                return None, type(e).__name__
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(send, pairs))
+    with app.app_context():
+        writer = chat_writer.get_writer()
+        if writer:
+            writer.close()
+    elapsed = time.perf_counter() - start
+
+    return [i for i, _ in results if i], [e for _, e in results if e], elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de escritura de mensajes de chat')
+    parser.add_argument('--database-url', help='Base de datos de pruebas (se borra). Default: SQLite temporal')
+    parser.add_argument('--messages', type=int, default=5000, help='Mensajes totales (default: 5000)')
+    parser.add_argument('--workers', type=int, default=4, help='Procesos en paralelo (default: 4)')
+    parser.add_argument('--threads', type=int, default=8, help='Hilos por proceso (default: 8)')
+    parser.add_argument('--users', type=int, default=20, help='Usuarios que chatean entre sí (default: 20)')
+    parser.add_argument('--buffer', action='store_true', help='Usar el buffer de escritura agrupada')
+    args = parser.parse_args()
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+
+    from sqlalchemy import func
+    from app import db
+    from app.models import User, ChatMessage, Conversation
+
+    app = make_app(database_url, args.buffer)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        users = [User(username=f'benchmark{i}', email=f'benchmark{i}@example.com', role='usuario')
+                 for i in range(args.users)]
+        db.session.add_all(users)
+        db.session.commit()
+        user_ids = [u.id for u in users]
+        db.engine.dispose()
+
+    print("=" * 60)
+    print("💬 BENCHMARK DE MENSAJES DE CHAT")
+    print("=" * 60)
+    print(f"   Modo:       {'buffer (escritura agrupada)' if args.buffer else 'directo (un commit por mensaje)'}")
+    print(f"   Mensajes:   {args.messages}")
+    print(f"   Procesos:   {args.workers} x {args.threads} hilos")
+    print(f"   Usuarios:   {args.users}")
+
+    per_worker = [args.messages // args.workers + (1 if i < args.messages % args.workers else 0)
+                  for i in range(args.workers)]
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(run_worker, database_url, args.buffer, user_ids, count, args.threads)
+                   for count in per_worker]
+        results = [f.result() for f in futures]
+    elapsed = time.perf_counter() - start
+
+    ids = [i for worker_ids, _, _ in results for i in worker_ids]
+    errors = Counter(e for _, worker_errors, _ in results for e in worker_errors)
+    duplicates = len(ids) - len(set(ids))
+
+    with app.app_context():
+        stored = db.session.query(func.count(ChatMessage.id)).scalar()
+        unread = db.session.query(func.sum(Conversation.unread_a + Conversation.unread_b)).scalar() or 0
+
+    print(f"\n📊 Resultados:")
+    print(f"   Enviados:     {len(ids)} en {elapsed:.2f}s ({len(ids) / elapsed:.0f} mensajes/s)")
+    print(f"   Guardados:    {stored}")
+    print(f"   No leídos:    {unread} (contadores de conversaciones)")
+    print(f"   Duplicados:   {duplicates}")
+    print(f"   Errores:      {sum(errors.values())} {dict(errors) if errors else ''}")
+
+    if duplicates or errors or stored != len(ids) or unread != len(ids):
+        print("\n❌ Faltan mensajes, hay ids repetidos o errores")
+        sys.exit(1)
+    print("\n✅ Todos los mensajes se guardaron una sola vez")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+"""
+Benchmark de notificaciones por email contra un servidor SMTP local.
+
+Arranca un sumidero SMTP en 127.0.0.1 (acepta y descarta los correos, sin
+enviar nada a Internet) y llama a las funciones de app/email.py (asignación,
+comentario, chat y restablecimiento de contraseña) al ritmo indicado. Reporta
+percentiles de latencia de la llamada (lo que espera la petición web) y de
+entrega (desde que se encola hasta que el sumidero lo recibe), correos/segundo,
+hilos y conexiones SMTP abiertas, y la tasa de fallos.
+
+Con --sink-delay se simula un servidor lento y con --fail-rate uno que
+rechaza una parte de los correos (451, se reintentan más tarde).
+
+Usa una base SQLite temporal. Uso:
+    py scripts/benchmark_email.py [--rate 50] [--duration 10] [--kinds assigned,comment,chat,reset]
+                                  [--concurrency 8] [--sink-delay 0.01] [--fail-rate 0]
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import argparse
+import os
+import random
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+KINDS = ('assigned', 'comment', 'chat', 'reset')
+
+class SinkHandler(socketserver.StreamRequestHandler):
+    """Minimal SMTP server session: accepts every command and counts the messages."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        sink = self.server
+        with sink.lock:
+            sink.connections += 1
+            sink.open_connections += 1
+            sink.peak_connections = max(sink.peak_connections, sink.open_connections)
+        try:
+            self.reply('220 benchmark sink')
+            while line := self.rfile.readline():
+                command = line[:4].upper()
+                if command == b'EHLO':
+                    self.reply('250-benchmark sink')
+                    self.reply('250 8BITMIME')
+                elif command == b'DATA':
+                    self.reply('354 End data with <CR><LF>.<CR><LF>')
+                    while self.rfile.readline() not in (b'.\r\n', b''):
+                        pass
+                    time.sleep(sink.delay)
+                    if random.random() < sink.fail_rate:
+                        with sink.lock:
+                            sink.rejected += 1
+                        self.reply('451 Temporary failure')
+                    else:
+                        with sink.lock:
+                            sink.received.append(time.time())
+                        self.reply('250 OK')
+                elif command == b'QUIT':
+                    self.reply('221 Bye')
+                    break
+                else:  # HELO, MAIL, RCPT, RSET, NOOP
+                    self.reply('250 OK')
+        finally:
+            with sink.lock:
+                sink.open_connections -= 1
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, delay, fail_rate):
+        super().__init__(('127.0.0.1', 0), SinkHandler)
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.lock = threading.Lock()
+        self.received = []
+        self.rejected = 0
+        self.connections = 0
+        self.open_connections = 0
+        self.peak_connections = 0
+
+def make_app(database_url, port):
+    from config import Config
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 60}}
+        MAIL_SERVER = '127.0.0.1'
+        MAIL_PORT = port
+        MAIL_USE_TLS = False
+        MAIL_USE_SSL = False
+        MAIL_USERNAME = None
+        MAIL_PASSWORD = None
+        MAIL_SUPPRESS_SEND = False
+        EMAIL_POLL = 1
+        SERVER_NAME = 'localhost'
+
+    from app import create_app
+    return create_app(BenchmarkConfig)
+
+def percentiles(values):
+    if not values:
+        return '-'
+    values = sorted(values)
+    pick = lambda p: values[min(len(values) - 1, int(len(values) * p / 100))] * 1000
+    return f'p50 {pick(50):.1f} ms · p95 {pick(95):.1f} ms · p99 {pick(99):.1f} ms · máx {values[-1] * 1000:.1f} ms'
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de notificaciones por email')
+    parser.add_argument('--rate', type=float, default=50, help='Notificaciones por segundo (default: 50)')
+    parser.add_argument('--duration', type=float, default=10, help='Segundos de carga (default: 10)')
+    parser.add_argument('--kinds', default=','.join(KINDS), help=f'Tipos a enviar (default: {",".join(KINDS)})')
+    parser.add_argument('--concurrency', type=int, default=8, help='Hilos que llaman a las funciones (default: 8)')
+    parser.add_argument('--sink-delay', type=float, default=0.01, help='Segundos que tarda el sumidero por correo (default: 0.01)')
+    parser.add_argument('--fail-rate', type=float, default=0, help='Fracción de correos rechazados con 451 (default: 0)')
+    parser.add_argument('--drain-timeout', type=float, default=60, help='Segundos máximos de espera al vaciado (default: 60)')
+    args = parser.parse_args()
+
+    kinds = [kind for kind in args.kinds.split(',') if kind]
+    if not kinds or any(kind not in KINDS for kind in kinds):
+        parser.error(f'--kinds debe ser una lista de: {", ".join(KINDS)}')
+
+    sink = SmtpSink(args.sink_delay, args.fail_rate)
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+
+    from sqlalchemy import func
+    from app import db, email as notifications
+    from app.models import EmailOutbox
+
+    database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+    app = make_app(database_url, sink.server_address[1])
+    with app.app_context():
+        db.create_all()
+
+    # The notification functions only read attributes of these
+    users = [SimpleNamespace(id=i, username=f'usuario{i}', email=f'usuario{i}@example.com') for i in range(1, 21)]
+    ticket = SimpleNamespace(id=1, title='Impresora sin conexión', priority='alta', status='en_proceso')
+
+    def notify(kind):
+        user, other = random.sample(users, 2)
+        if kind == 'assigned':
+            notifications.send_ticket_assigned_email(ticket, user)
+        elif kind == 'comment':
+            notifications.send_ticket_comment_email(ticket, other, 'Ya revisé el cable de red.', user)
+        elif kind == 'chat':
+            notifications.send_chat_notification_email(other, user, '¿Puedes revisar mi ticket?')
+        else:
+            notifications.send_password_reset_email(user, 'benchmark-token')
+
+    call_times, errors = [], []
+    peak_threads = [threading.active_count()]
+    lock = threading.Lock()
+
+    def call(kind):
+        with app.test_request_context():
+            start = time.perf_counter()
+            try:
+                notify(kind)
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+                return
+            elapsed = time.perf_counter() - start
+        with lock:
+            call_times.append(elapsed)
+            peak_threads[0] = max(peak_threads[0], threading.active_count())
+
+    print("=" * 60)
+    print("📧 BENCHMARK DE NOTIFICACIONES POR EMAIL")
+    print("=" * 60)
+    print(f"   Tipos:        {', '.join(kinds)}")
+    print(f"   Ritmo:        {args.rate:g}/s durante {args.duration:g}s ({args.concurrency} hilos)")
+    print(f"   Sumidero:     127.0.0.1:{sink.server_address[1]} ({args.sink_delay * 1000:g} ms/correo, {args.fail_rate:.0%} rechazos)")
+
+    total = int(args.rate * args.duration)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for i in range(total):
+            # Open loop: calls start on schedule even if earlier ones are slow
+            delay = start + i / args.rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(call, kinds[i % len(kinds)])
+            peak_threads[0] = max(peak_threads[0], threading.active_count())
+    load_time = time.perf_counter() - start
+
+    # Wait until everything was sent or is waiting for a retry
+    with app.app_context():
+        deadline = time.monotonic() + args.drain_timeout
+        while time.monotonic() < deadline:
+            peak_threads[0] = max(peak_threads[0], threading.active_count())
+            busy = db.session.query(func.count(EmailOutbox.id)).filter(
+                EmailOutbox.status.in_(('pending', 'sending')), EmailOutbox.attempts == 0).scalar()
+            db.session.rollback()
+            if not busy:
+                break
+            time.sleep(0.1)
+        elapsed = time.perf_counter() - start
+
+        rows = db.session.query(EmailOutbox.status, EmailOutbox.attempts,
+                                EmailOutbox.created_at, EmailOutbox.sent_at).all()
+
+    sent = [row for row in rows if row.status == 'sent']
+    retrying = [row for row in rows if row.status != 'sent']
+    delivery = [(row.sent_at - row.created_at).total_seconds() for row in sent]
+    received = len(sink.received)
+
+    print(f"\n📊 Resultados:")
+    print(f"   Encoladas:    {len(call_times)} en {load_time:.2f}s ({len(call_times) / load_time:.0f}/s)")
+    print(f"   Llamada:      {percentiles(call_times)}")
+    print(f"   Entrega:      {percentiles(delivery)}")
+    print(f"   Recibidos:    {received} en {elapsed:.2f}s ({received / elapsed:.0f} correos/s)")
+    print(f"   Hilos:        máx {peak_threads[0]} en el proceso")
+    print(f"   Conexiones:   {sink.connections} SMTP abiertas (máx {sink.peak_connections} a la vez)")
+    print(f"   Rechazados:   {sink.rejected} ({sink.rejected / max(1, sink.rejected + received):.1%}), "
+          f"{len(retrying)} pendientes de reintento")
+    print(f"   Errores:      {len(errors)} {errors[:3] if errors else ''}")
+
+    if errors or len(call_times) != total or received + len(retrying) < total:
+        print("\n❌ Hubo notificaciones perdidas o errores")
+        sys.exit(1)
+    print("\n✅ Todas las notificaciones se enviaron o quedaron en cola para reintento")
+
+if __name__ == '__main__':
+    main()
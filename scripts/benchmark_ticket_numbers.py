@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""
+Benchmark de asignación de números de ticket bajo concurrencia.
+
+Lanza varios procesos (como los workers del servidor), cada uno con varios
+hilos, que crean tickets en paralelo. Verifica que no haya números repetidos
+y reporta tickets/segundo. Con --legacy usa el método anterior (LIKE + max
+en Python) para comparar las colisiones.
+
+Por defecto usa una base SQLite temporal. Para MySQL pasa una base de datos
+de pruebas VACÍA (sus tablas se borran y se recrean):
+    py scripts/benchmark_ticket_numbers.py --database-url mysql+mysqlconnector://root@127.0.0.1/ticket_bench
+
+Uso:
+    py scripts/benchmark_ticket_numbers.py [--tickets 5000] [--workers 4] [--threads 8] [--block-size 1] [--legacy]
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+def make_app(database_url, block_size):
+    from config import Config
+
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 60}} if database_url.startswith('sqlite') else {}
+        TICKET_NUMBER_BLOCK_SIZE = block_size
+
+    from app import create_app
+    return create_app(BenchmarkConfig)
+
+def legacy_ticket_number():
+    """Previous implementation: scan with LIKE and increment in Python"""
+    from datetime import datetime
+    from app.models import Ticket
+    year = datetime.utcnow().year
+    last_ticket = Ticket.query.filter(
+        Ticket.ticket_number.like(f'TKT-{year}-%')
+    ).order_by(Ticket.id.desc()).first()
+    new_num = int(last_ticket.ticket_number.split('-')[2]) + 1 if last_ticket else 1
+    return f'TKT-{year}-{new_num:05d}'
+
+def run_worker(database_url, block_size, legacy, creator_id, count, threads):
+    """Create count tickets from threads threads. Returns (numbers, errors)."""
+    from app import db
+    from app.models import Ticket
+
+    app = make_app(database_url, block_size)
+
+    def create(_):
+        with app.app_context():
+            try:
+                number = legacy_ticket_number() if legacy else Ticket.generate_ticket_number()
+                db.session.add(Ticket(ticket_number=number, title='Benchmark', description='-',
+                                      priority='media', created_by_id=creator_id))
+                db.session.commit()
+                return number, None
+            except Exception as e:
+                db.session.rollback()
+                return None, type(e).__name__
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(create, range(count)))
+
+    return [n for n, _ in results if n], [e for _, e in results if e]
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de números de ticket concurrentes')
+    parser.add_argument('--database-url', help='Base de datos de pruebas (se borra). Default: SQLite temporal')
+    parser.add_argument('--tickets', type=int, default=5000, help='Tickets totales (default: 5000)')
+    parser.add_argument('--workers', type=int, default=4, help='Procesos en paralelo (default: 4)')
+    parser.add_argument('--threads', type=int, default=8, help='Hilos por proceso (default: 8)')
+    parser.add_argument('--block-size', type=int, default=1, help='Números reservados por worker (default: 1)')
+    parser.add_argument('--legacy', action='store_true', help='Usar el método anterior (LIKE) para comparar')
+    args = parser.parse_args()
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+
+    from app import db
+    from app.models import User
+
+    app = make_app(database_url, args.block_size)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        creator = User(username='benchmark', email='benchmark@example.com', role='usuario')
+        db.session.add(creator)
+        db.session.commit()
+        creator_id = creator.id
+        db.engine.dispose()
+
+    print("=" * 60)
+    print("🎫 BENCHMARK DE NÚMEROS DE TICKET")
+    print("=" * 60)
+    print(f"   Método:     {'anterior (LIKE)' if args.legacy else 'secuencia por año'}")
+    print(f"   Tickets:    {args.tickets}")
+    print(f"   Procesos:   {args.workers} x {args.threads} hilos")
+    print(f"   Bloque:     {args.block_size}")
+
+    per_worker = [args.tickets // args.workers + (1 if i < args.tickets % args.workers else 0)
+                  for i in range(args.workers)]
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(run_worker, database_url, args.block_size, args.legacy,
+                               creator_id, count, args.threads) for count in per_worker]
+        results = [f.result() for f in futures]
+    elapsed = time.perf_counter() - start
+
+    numbers = [n for worker_numbers, _ in results for n in worker_numbers]
+    errors = Counter(e for _, worker_errors in results for e in worker_errors)
+    duplicates = len(numbers) - len(set(numbers))
+
+    print(f"\n📊 Resultados:")
+    print(f"   Creados:      {len(numbers)} en {elapsed:.2f}s ({len(numbers) / elapsed:.0f} tickets/s)")
+    print(f"   Duplicados:   {duplicates}")
+    print(f"   Errores:      {sum(errors.values())} {dict(errors) if errors else ''}")
+
+    if duplicates or errors:
+        print("\n❌ Hubo colisiones o errores")
+        sys.exit(1)
+    print("\n✅ Todos los números son únicos")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+"""
+Regression check for query plans.
+
+Seeds a scratch database, calls every route (and chat event) as each role
+while recording the SQL they execute, then runs EXPLAIN on each statement and
+fails if a filtered query on a large table (ticket, comment, chat_message)
+degrades to a full table scan.
+
+By default uses a temporary SQLite database. To check MySQL plans, pass an
+EMPTY scratch database (all its tables are dropped and recreated):
+    py scripts/check_query_plans.py --database-url mysql+mysqlconnector://root@127.0.0.1/ticket_plan_check
+
+Exit code 0 if every plan uses an index, 1 otherwise.
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser(description='Verificar planes de consulta de las rutas')
+parser.add_argument('--database-url', help='Base de datos de pruebas (se borra). Default: SQLite temporal')
+parser.add_argument('--tickets', type=int, default=5000, help='Tickets a generar (default: 5000)')
+parser.add_argument('--verbose', action='store_true', help='Mostrar todos los planes')
+args = parser.parse_args()
+
+database_url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'plan_check.db')
+
+from sqlalchemy import event, insert
+from config import Config
+
+class PlanCheckConfig(Config):
+    SQLALCHEMY_DATABASE_URI = database_url
+    WTF_CSRF_ENABLED = False
+    MAIL_SUPPRESS_SEND = True
+    RATELIMIT_ENABLED = False
+    REPORTS_FOLDER = os.path.join(tempfile.mkdtemp(), 'reports')
+
+from app import create_app, db, socketio
+from app.models import User, Ticket, Comment, ChatMessage, SystemSettings
+from app.ticket_stats import rebuild
+from app import conversations
+
+# Tables that grow without bound; small tables (user, settings...) may be scanned
+HOT_TABLES = {'ticket', 'comment', 'chat_message', 'chat_message_archive', 'conversation'}
+
+app = create_app(PlanCheckConfig)
+
+def seed():
+    """Create users, tickets, comments and chat messages"""
+    random.seed(42)
+    db.drop_all()
+    db.create_all()
+    db.session.add(SystemSettings())
+
+    users = [User(username='admin', email='admin@example.com', role='admin')]
+    users += [User(username=f'tecnico{i}', email=f'tecnico{i}@example.com', role='tecnico') for i in range(1, 11)]
+    users += [User(username=f'usuario{i}', email=f'usuario{i}@example.com', role='usuario') for i in range(1, 51)]
+    for user in users:
+        user.set_password('Plancheck1')
+    db.session.add_all(users)
+    db.session.commit()
+
+    techs = [u.id for u in users if u.role == 'tecnico']
+    creators = [u.id for u in users if u.role == 'usuario']
+    now = datetime.utcnow()
+
+    tickets = [{
+        'ticket_number': f'TKT-{now.year - 1}-{i:05d}',
+        'title': f'Ticket de prueba {i}',
+        'description': 'Descripción del problema reportado',
+        'status': random.choice(['abierto', 'en_proceso', 'cerrado']),
+        'priority': random.choice(['alta', 'media', 'baja']),
+        'created_at': now - timedelta(minutes=random.randint(0, 525600)),
+        'created_by_id': random.choice(creators),
+        'assigned_to_id': random.choice(techs) if random.random() > 0.2 else None,
+    } for i in range(1, args.tickets + 1)]
+    db.session.execute(insert(Ticket), tickets)
+
+    comments = [{
+        'content': f'Comentario {i}',
+        'created_at': now - timedelta(minutes=random.randint(0, 525600)),
+        'user_id': random.choice(techs + creators),
+        'ticket_id': random.randint(1, args.tickets),
+    } for i in range(args.tickets)]
+    db.session.execute(insert(Comment), comments)
+
+    messages = []
+    for i in range(args.tickets):
+        sender, receiver = random.sample(techs + creators, 2)
+        messages.append({
+            'sender_id': sender,
+            'receiver_id': receiver,
+            'content': f'Mensaje {i}',
+            'timestamp': now - timedelta(minutes=random.randint(0, 525600)),
+            'read': random.random() > 0.3,
+        })
+    db.session.execute(insert(ChatMessage), messages)
+    db.session.commit()
+    rebuild()
+    conversations.rebuild()
+
+    # Refresh optimizer statistics
+    if db.engine.dialect.name == 'mysql':
+        db.session.execute(db.text('ANALYZE TABLE ticket, comment, chat_message, conversation'))
+    else:
+        db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+
+def full_scans(engine, statement, parameters):
+    """Return the plan lines where a hot table is read with a full scan"""
+    with engine.connect() as conn:
+        if engine.dialect.name == 'mysql':
+            rows = conn.exec_driver_sql('EXPLAIN ' + statement, parameters).mappings().all()
+            plan = [f"{row['table']}: type={row['type']} key={row['key']} rows={row['rows']}" for row in rows]
+            scans = [line for row, line in zip(rows, plan)
+                     if row['type'] == 'ALL' and re.sub(r'_\d+$', '', row['table'] or '') in HOT_TABLES]
+        else:
+            rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+            plan = [row[-1] for row in rows]
+            scans = []
+            for line in plan:
+                match = re.match(r'SCAN (\w+)(?: AS \w+)?$', line)
+                if match and re.sub(r'_\d+$', '', match.group(1)) in HOT_TABLES:
+                    scans.append(line)
+    return plan, scans
+
+def is_checked(statement):
+    """Only filtered reads/writes touching a hot table are checked"""
+    sql = statement.lower()
+    if not sql.lstrip().startswith(('select', 'update', 'delete')):
+        return False
+    if not re.search(r"\bwhere\b", sql):
+        return False  # Full reads by design (e.g. an admin exporting every ticket)
+    return any(re.search(rf'\b{table}\b', sql) for table in HOT_TABLES)
+
+def run_checks(engine, tech, tech_id, user, ticket_id):
+    """
+    Call each route as its user and check the plans of the statements it ran.
+    Runs outside of an app context so every request gets its own (and its own
+    logged in user).
+    """
+    # (username, description, action)
+    checks = [
+        ('admin', 'GET /', lambda c: c.get('/')),
+        ('admin', 'GET /api/dashboard-stats', lambda c: c.get('/api/dashboard-stats')),
+        ('admin', 'GET /api/trends', lambda c: c.get('/api/trends?dimension=assignee')),
+        ('admin', 'GET /tickets', lambda c: c.get('/tickets')),
+        ('admin', 'GET /tickets?status=abierto', lambda c: c.get('/tickets?status=abierto')),
+        ('admin', f'GET /ticket/{ticket_id}', lambda c: c.get(f'/ticket/{ticket_id}')),
+        ('admin', f'POST /ticket/{ticket_id}', lambda c: c.post(f'/ticket/{ticket_id}', data={'status': 'en_proceso', 'assigned_to': str(tech_id)})),
+        ('admin', 'GET /export/csv', lambda c: c.get('/export/csv')),
+        ('admin', 'GET /export/parquet?since', lambda c: c.get(f'/export/parquet?since={since}')),
+        ('admin', 'GET /search', lambda c: c.get('/search?q=problema+prueba')),
+        ('admin', 'GET /search (id)', lambda c: c.get(f'/search?q={ticket_id}')),
+        (tech, 'GET /', lambda c: c.get('/')),
+        (tech, 'GET /tickets', lambda c: c.get('/tickets')),
+        (tech, 'GET /export/csv', lambda c: c.get('/export/csv')),
+        (tech, 'GET /export/excel', lambda c: c.get('/export/excel')),
+        (tech, 'GET /export/pdf', lambda c: c.get('/export/pdf')),
+        (user, 'GET /', lambda c: c.get('/')),
+        (user, 'GET /my_tickets', lambda c: c.get('/my_tickets')),
+        (user, 'POST /ticket/create', lambda c: c.post('/ticket/create', data={'title': 'Nuevo', 'description': 'Detalle', 'priority': 'alta'})),
+        (user, f'POST /ticket/{ticket_id}/comment', lambda c: c.post(f'/ticket/{ticket_id}/comment', data={'content': 'Gracias'})),
+        (user, 'GET /export/csv', lambda c: c.get('/export/csv')),
+        (user, 'GET /search', lambda c: c.get('/search?q=prueba')),
+    ]
+
+    # Chat events, sent over a Socket.IO test client
+    chat_checks = [
+        (user, 'socket connect', None),
+        (user, 'socket get_chat_history', ('get_chat_history', {'user_id': tech_id})),
+        (user, 'socket get_chat_history (older)', ('get_chat_history', {'user_id': tech_id, 'before_id': 10 ** 9})),
+        (user, 'socket get_chat_history (archive)', ('get_chat_history', {'user_id': tech_id, 'before_id': 1})),
+        (user, 'socket get_conversations', ('get_conversations',)),
+        (user, 'socket mark_as_read', ('mark_as_read', {'sender_id': tech_id})),
+        (user, 'socket private_message', ('private_message', {'receiver_id': tech_id, 'content': 'Hola'})),
+    ]
+
+    since = (datetime.utcnow() - timedelta(days=1)).isoformat()
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            captured.append((statement, parameters))
+
+    failures = 0
+    clients = {}
+
+    def client_for(username):
+        if username not in clients:
+            client = app.test_client()
+            client.post('/login', data={'username': username, 'password': 'Plancheck1'})
+            clients[username] = client
+        return clients[username]
+
+    def check(name, action):
+        nonlocal failures
+        captured.clear()
+        event.listen(engine, 'before_cursor_execute', capture)
+        try:
+            response = action()
+            # Streamed responses run their queries while the body is read
+            if hasattr(response, 'get_data'):
+                response.get_data()
+                response.close()
+        finally:
+            event.remove(engine, 'before_cursor_execute', capture)
+
+        statements = [(s, p) for s, p in captured if is_checked(s)]
+        route_failures = []
+        for statement, parameters in statements:
+            plan, scans = full_scans(engine, statement, parameters)
+            if scans:
+                route_failures.append((statement, plan))
+            elif args.verbose:
+                print(f"      {' | '.join(plan)}")
+
+        if route_failures:
+            failures += len(route_failures)
+            print(f"   ❌ {name}: {len(route_failures)} de {len(statements)} consultas con escaneo completo")
+            for statement, plan in route_failures:
+                print(f"      SQL:  {' '.join(statement.split())[:300]}")
+                print(f"      PLAN: {' | '.join(plan)}")
+        else:
+            print(f"   ✅ {name}: {len(statements)} consultas usan índices")
+
+    for username, name, action in checks:
+        client = client_for(username)
+        check(f'{username:<10} {name}', lambda: action(client))
+
+    for username, name, chat_event in chat_checks:
+        client = client_for(username)
+        if chat_event is None:
+            holder = {}
+            check(f'{username:<10} {name}', lambda: holder.update(
+                sio=socketio.test_client(app, flask_test_client=client)))
+            sio = holder['sio']
+        else:
+            check(f'{username:<10} {name}', lambda: sio.emit(*chat_event))
+    sio.disconnect()
+
+    return failures
+
+print("=" * 60)
+print("🔎 VERIFICACIÓN DE PLANES DE CONSULTA")
+print("=" * 60)
+
+with app.app_context():
+    engine = db.engine
+    print(f"\n📌 Base de datos: {engine.dialect.name}")
+    print(f"📌 Generando {args.tickets} tickets, comentarios y mensajes...")
+    seed()
+
+    # A ticket of tecnico1 and its creator
+    tech_id = User.query.filter_by(username='tecnico1').first().id
+    sample = Ticket.query.filter_by(assigned_to_id=tech_id).first()
+    tech, user, ticket_id = 'tecnico1', sample.created_by.username, sample.id
+
+print("\n📌 Ejecutando rutas y analizando planes:\n")
+failures = run_checks(engine, tech, tech_id, user, ticket_id)
+
+print()
+print("=" * 60)
+if failures:
+    print(f"❌ {failures} consultas degradadas a escaneo completo de tabla")
+    print("=" * 60)
+    sys.exit(1)
+print("✅ Todas las consultas filtradas usan índices")
+print("=" * 60)
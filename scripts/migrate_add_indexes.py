@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Crea en una base de datos existente los índices declarados en los modelos
+que todavía no existen (db.create_all() no modifica tablas ya creadas), y
+elimina los índices que fueron reemplazados por otros (OBSOLETE_INDEXES).
+
+En MySQL 8 (InnoDB) CREATE INDEX se ejecuta en línea: las tablas siguen
+aceptando lecturas y escrituras mientras se construye cada índice.
+
+Uso:
+    py scripts/migrate_add_indexes.py [--dry-run]
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+from app import create_app, db
+import argparse
+import sys
+import time
+
+# Indexes replaced by others in the models: {table: [index names]}
+OBSOLETE_INDEXES = {
+    # Replaced by ix_chat_message_pair_id (history paged by id)
+    'chat_message': ['ix_chat_message_pair_timestamp'],
+}
+
+parser = argparse.ArgumentParser(description='Crear índices faltantes')
+parser.add_argument('--dry-run', action='store_true', help='Solo mostrar los índices que faltan')
+args = parser.parse_args()
+
+app = create_app()
+
+with app.app_context():
+    try:
+        print("=" * 60)
+        print("🗂️  MIGRACIÓN DE ÍNDICES")
+        print("=" * 60)
+
+        # New tables (counters, rollups...) are created with their indexes
+        if not args.dry_run:
+            db.create_all()
+
+        inspector = db.inspect(db.engine)
+        created = 0
+
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+
+            for index in sorted(table.indexes, key=lambda i: i.name):
+                if index.name in existing:
+                    continue
+                # Indexes declared for another backend (e.g. MySQL FULLTEXT)
+                ddl_if = getattr(index, '_ddl_if', None)
+                if ddl_if is not None and ddl_if.dialect and ddl_if.dialect != db.engine.dialect.name:
+                    continue
+
+                columns = ', '.join(column.name for column in index.columns)
+                if args.dry_run:
+                    print(f"   - Falta {index.name} en {table.name} ({columns})")
+                    created += 1
+                    continue
+
+                print(f"   ⏳ Creando {index.name} en {table.name} ({columns})...")
+                start = time.time()
+                index.create(bind=db.engine)
+                print(f"   ✅ {index.name} creado en {time.time() - start:.1f}s")
+                created += 1
+
+        # Drop replaced indexes once their replacements exist; they only slow down writes
+        dropped = 0
+        for table_name, names in OBSOLETE_INDEXES.items():
+            if not inspector.has_table(table_name):
+                continue
+            existing = {index['name'] for index in inspector.get_indexes(table_name)}
+            for name in names:
+                if name not in existing:
+                    continue
+                if args.dry_run:
+                    print(f"   - Sobra {name} en {table_name}")
+                    dropped += 1
+                    continue
+
+                print(f"   ⏳ Eliminando {name} de {table_name}...")
+                if db.engine.dialect.name == 'mysql':
+                    statement = f'DROP INDEX {name} ON {table_name}'
+                else:
+                    statement = f'DROP INDEX {name}'
+                with db.engine.begin() as conn:
+                    conn.execute(db.text(statement))
+                print(f"   ✅ {name} eliminado")
+                dropped += 1
+
+        if dropped:
+            print(f"\n🗑️  {dropped} índices obsoletos {'por eliminar' if args.dry_run else 'eliminados'}")
+        if created == 0:
+            print("\n✅ Todos los índices ya existen")
+        elif args.dry_run:
+            print(f"\n📋 {created} índices por crear (ejecuta sin --dry-run para crearlos)")
+        else:
+            print(f"\n✅ {created} índices creados")
+    except Exception as e:
+        print(f"\n❌ Error al crear índices: {e}")
+        sys.exit(1)
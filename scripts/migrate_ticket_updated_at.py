@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+Agrega la columna ticket.updated_at (y su índice) a una base de datos
+existente, inicializándola con la fecha de creación de cada ticket.
+
+La usa la exportación incremental (/export/parquet?since=...). Los tickets
+modificados a partir de ahora la actualizan automáticamente.
+
+Uso:
+    py scripts/migrate_ticket_updated_at.py [--batch-size 10000]
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+from app import create_app, db
+from app.models import Ticket
+import argparse
+import sys
+
+parser = argparse.ArgumentParser(description='Agregar ticket.updated_at')
+parser.add_argument('--batch-size', type=int, default=10000, help='Tickets por lote al inicializar (default: 10000)')
+args = parser.parse_args()
+
+app = create_app()
+
+with app.app_context():
+    try:
+        print("=" * 60)
+        print("🕒 MIGRACIÓN: ticket.updated_at")
+        print("=" * 60)
+
+        inspector = db.inspect(db.engine)
+        columns = {column['name'] for column in inspector.get_columns('ticket')}
+
+        if 'updated_at' in columns:
+            print("\n✅ La columna updated_at ya existe")
+        else:
+            print("\n⏳ Agregando columna updated_at...")
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql('ALTER TABLE ticket ADD COLUMN updated_at DATETIME NULL')
+
+        # Fill in batches by id range, so big tables are not locked at once
+        max_id = db.session.query(db.func.max(Ticket.id)).scalar() or 0
+        filled = 0
+        for start in range(0, max_id + 1, args.batch_size):
+            result = db.session.execute(
+                db.update(Ticket)
+                .where(Ticket.id >= start, Ticket.id < start + args.batch_size, Ticket.updated_at.is_(None))
+                .values(updated_at=Ticket.created_at)
+                .execution_options(synchronize_session=False))
+            db.session.commit()
+            filled += result.rowcount
+        print(f"   Tickets inicializados: {filled}")
+
+        existing = {index['name'] for index in inspector.get_indexes('ticket')}
+        index = next(i for i in Ticket.__table__.indexes if i.name == 'ix_ticket_updated_at')
+        if index.name not in existing:
+            print("⏳ Creando índice ix_ticket_updated_at...")
+            index.create(bind=db.engine)
+
+        print("\n✅ Migración completada")
+        print("=" * 60)
+    except Exception as e:
+        db.session.rollback()
+        print(f"\n❌ Error: {e}")
+        sys.exit(1)
@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+"""
+Recalcula las conversaciones del chat (último mensaje y mensajes no leídos
+de cada participante) a partir de la tabla de mensajes.
+
+Ejecutar después de actualizar a la versión con tabla de conversaciones,
+o si se modificaron mensajes directamente en la base de datos.
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+from app import create_app, db
+from app.conversations import rebuild
+import sys
+
+app = create_app()
+
+with app.app_context():
+    try:
+        print("=" * 60)
+        print("💬 RECONSTRUCCIÓN DE CONVERSACIONES DEL CHAT")
+        print("=" * 60)
+
+        # Create the conversation table if this is an existing deployment
+        db.create_all()
+
+        rows = rebuild()
+
+        print(f"\n✅ Conversaciones reconstruidas: {rows}")
+    except Exception as e:
+        db.session.rollback()
+        print(f"\n❌ Error al reconstruir conversaciones: {e}")
+        sys.exit(1)
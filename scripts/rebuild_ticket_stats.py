@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+"""
+Recalcula los contadores del dashboard a partir de la tabla de tickets.
+
+Ejecutar después de actualizar a la versión con contadores precalculados,
+o si se modificaron tickets directamente en la base de datos.
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+from app import create_app, db
+from app.ticket_stats import rebuild, get_stats, SCOPE_GLOBAL
+import sys
+
+app = create_app()
+
+with app.app_context():
+    try:
+        print("=" * 60)
+        print("📊 RECONSTRUCCIÓN DE CONTADORES DEL DASHBOARD")
+        print("=" * 60)
+
+        # Create the counters table if this is an existing deployment
+        db.create_all()
+
+        rows = rebuild()
+        stats = get_stats(SCOPE_GLOBAL, 0)
+
+        print(f"\n✅ Contadores reconstruidos: {rows} filas")
+        print(f"   - Total tickets: {stats['total']}")
+        print(f"   - Abiertos: {stats['open']}")
+        print(f"   - En proceso: {stats['process']}")
+        print(f"   - Cerrados: {stats['closed']}")
+    except Exception as e:
+        db.session.rollback()
+        print(f"\n❌ Error al reconstruir contadores: {e}")
+        sys.exit(1)
@@ -5,7 +5,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from app import create_app, db
-from app.models import User, Ticket, Comment, ChatMessage, AuditLog
+from app.models import User, Ticket, Comment, ChatMessage, AuditLog, TicketStatCounter, TicketDailyRollup, TicketSequence
 
 app = create_app()
 
@@ -34,6 +34,13 @@ with app.app_context():
     # Delete tickets
     deleted_counts['Tickets'] = Ticket.query.delete()
     
+    # Dashboard counters and daily rollups are derived from tickets
+    TicketStatCounter.query.delete()
+    TicketDailyRollup.query.delete()
+    
+    # Ticket numbers start again from 1
+    TicketSequence.query.delete()
+    
     # Delete chat messages
     deleted_counts['Mensajes de Chat'] = ChatMessage.query.delete()
     
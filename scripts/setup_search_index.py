@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+"""
+Prepara la búsqueda de texto completo de tickets en una base de datos existente:
+- MySQL: crea el índice FULLTEXT sobre título y descripción
+- SQLite: crea la tabla FTS5 con sus triggers y la llena con los tickets actuales
+
+Las instalaciones nuevas (init_database.py) ya lo crean automáticamente.
+"""
+from dotenv import load_dotenv
+load_dotenv()
+
+from app import create_app, db
+from app.ticket_search import setup_search_index
+import sys
+import time
+
+app = create_app()
+
+with app.app_context():
+    try:
+        print("=" * 60)
+        print("🔍 ÍNDICE DE BÚSQUEDA DE TICKETS")
+        print("=" * 60)
+
+        start = time.time()
+        result = setup_search_index()
+        print(f"\n✅ {result} ({time.time() - start:.1f}s)")
+    except Exception as e:
+        print(f"\n❌ Error al crear el índice de búsqueda: {e}")
+        sys.exit(1)
@@ -3,11 +3,12 @@ Script de prueba para verificar la configuración de email
 """
 from dotenv import load_dotenv
 import os
+import time
 
 # Cargar variables de entorno
 load_dotenv()
 
-from app import create_app
+from app import create_app, db
 from app.email import send_email
 
 app = create_app()
@@ -73,6 +74,17 @@ Help Desk System
                     """
                 )
                 
+                # The outbox sends it in the background: wait for the outcome
+                from app.models import EmailOutbox
+                for _ in range(60):
+                    time.sleep(0.5)
+                    db.session.rollback()  # See the pool's updates
+                    outbox = EmailOutbox.query.filter_by(recipient=email_destino).order_by(EmailOutbox.id.desc()).first()
+                    if outbox.status == 'sent' or outbox.attempts:
+                        break
+                if outbox.status != 'sent':
+                    raise Exception(outbox.last_error or 'El email sigue en la cola de salida')
+                
                 print("✅ Email enviado exitosamente!")
                 print(f"📬 Revisa la bandeja de entrada de {email_destino}")
                 print("   (También revisa la carpeta de spam)")
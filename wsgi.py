@@ -7,5 +7,13 @@ from app import create_app, socketio
 
 app = create_app()
 
+# Build the search suggestion index in the background
+from app.suggest_index import warm_up
+warm_up(app)
+
+# Send the emails left in the outbox (pending, or waiting for a retry)
+from app import email_outbox
+email_outbox.start(app)
+
 if __name__ == "__main__":
     socketio.run(app)